@@ -0,0 +1,7 @@
+#!/usr/bin/python3
+
+from .cli import main
+
+
+if __name__ == "__main__":
+    main()
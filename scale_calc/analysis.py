@@ -1,15 +1,17 @@
 #!/usr/bin/python3
 
 from .chords import *
+from .enharmonics import *
 from .transforms import *
+from .universe import *
 
 
 def spelling(scale, adjust_accidentals=True):
     """
     Attempt to spell out all of the notes in a scale.  This returns a list of
     human-readable note names.  If the adjust_accidentals parameter is set True,
-    then this will attempt to rewrite the accidentals in the scale in such a
-    way that minimizes repeat note names.
+    then this will pick the spelling of the scale's accidentals that minimizes
+    repeat note names.  See "spell_pitch_classes" for how ties are broken.
 
     For example, Scale("WWHWHWHH", "C#") could be written as either
     "Db, Eb, F, Gb, Ab, A, B, C" or as "C#, D#, F, F#, G#, A, B, C".
@@ -17,134 +19,254 @@ def spelling(scale, adjust_accidentals=True):
     if not scale.has_tonic():
         raise ValueError("The scale must have the tonic set to determine the spelling!")
 
-    notes = [NOTE_NAMES[note % 12] for note, state in enumerate(scale.keyboard[:-1], scale.tonic) if state]
-    if not adjust_accidentals:
-        return notes
-
-    def rewrite(notes, rewrite_tonic):
-        start = 0 if rewrite_tonic else 1
-        for i in range(start, len(notes)):
-            prev = notes[(i -1) % len(notes)]
-            this = notes[i]
-            push = note_distance(prev, this) <= 2
-            rename = ALTERNATES.get(this)
-            if push and rename:
-                notes[i] = rename
-        return notes
-
-    def unique_letter_names(notes):
-        return len({note[0] for note in notes})
-
-    minimal = rewrite(list(notes), False)
-    maximal = rewrite(list(notes), True)
-
-    if unique_letter_names(maximal) > unique_letter_names(minimal):
-        return maximal
-    else:
-        return minimal
+    if adjust_accidentals:
+        return list(spell_scale(scale.mask, scale.tonic))
+    return [NOTE_NAMES[note] for note in scale.notes()]
+
 
+# Roman numeral case and suffix for each seventh chord, for "degree_numeral".
+SEVENTH_NUMERALS = {
+    "Major 7th": (str.upper, "M7"),
+    "Dominant 7th": (str.upper, "7"),
+    "Minor 7th": (str.lower, "7"),
+    "Minor Major 7th": (str.lower, "M7"),
+    "Half-diminished 7th": (str.lower, "%7"),
+    "Diminished 7th": (str.lower, "*7"),
+    "Diminished Major 7th": (str.lower, "*M7"),
+    "Augmented 7th": (str.upper, "+7"),
+    "Augmented Major 7th": (str.upper, "+M7"),
+    "Dominant 7th b5": (str.upper, "7b5"),
+    "Major 7th b5": (str.upper, "M7b5"),
+}
 
-def degree_numeral(degree, quality):
+
+def degree_numeral(degree, quality, seventh=None, extensions=()):
     """
     For a given degree number and harmonic quality, generate the appropriate roman
-    numeral notation.
+    numeral notation.  If the name of a seventh chord is given, the numeral is for
+    that chord instead, such as "V7", "IM7", or "vii%7" (half-diminished).  Any
+    extensions, such as "b9" or "13", are listed after it in parentheses.
     """
     assert(type(degree) == int)
     assert(degree > 0)
 
-    if quality == "Unknown":
-        return str(degree) + "?"
+    suffix = "(" + ",".join(extensions) + ")" if extensions else ""
+
+    if quality == "Unknown" and seventh is None:
+        return str(degree) + "?" + suffix
 
     try:
         degree = NUMERALS[degree-1]
     except IndexError:
         degree = str(degree)
 
+    if seventh is not None:
+        case, seventh = SEVENTH_NUMERALS[seventh]
+        return case(degree) + seventh + suffix
+
     if quality == "Minor":
-        return degree.lower()
+        return degree.lower() + suffix
 
     elif quality == "Major":
-        return degree.upper()
+        return degree.upper() + suffix
 
     elif quality == "Diminished":
-        return degree.lower() + "*"
+        return degree.lower() + "*" + suffix
 
     elif quality == "Augmented":
-        return degree.upper() + "+"
-
-
-def triad_quality(keyboard):
-    """
-    Attempt to determine the harmonic quality of a triad.
-    """
-    def fnord(quality):
-        chord = Chord(quality + " 5th")
-        cmp = compare_chords(chord, keyboard)[0]
-        return (cmp, quality)
-    qualities = ("Diminished", "Minor", "Major", "Augmented")
-    cmp, quality = sorted(map(fnord, qualities), key=lambda x: x[0])[-1]
-    if cmp == 1.0:
-        return quality
-    else:
-        return "Unknown"
+        return degree.upper() + "+" + suffix
 
 
 def scale_degree_qualities(scale):
     """
     For a given scale, return the list of harmonic qualities for the scale's degrees.
     """
-    extended = scale.keyboard[:-1] + scale.keyboard[:-1]
-    keyboards = [extended[i:] for i, state in enumerate(scale.keyboard[:-1]) if state]
-    return map(triad_quality, scale.degree_keyboards())
+    return scale_info(scale.mask).qualities
 
 
 def find_chords(scale):
     """
     Returns the set of all of the common chords in the given scale.
     """
-    degrees = zip(spelling(scale), scale.degree_keyboards())
+    degrees = zip(spelling(scale), scale.degree_masks())
+    index = common_chord_index()
     chords = set()
-    for root, keyboard in degrees:
-        extend = keyboard * 2
-        for name, chord in COMMON_CHORDS.items():
-            if compare_chords(chord, extend)[0] == 1.0:
-                chords.add(Chord(chord, name=name, root=root))
+    for root, mask in degrees:
+        for name, chord in index.matches(mask):
+            chords.add(Chord(chord, name=name, root=root))
     return chords
 
 
-def pretty_print(scale):
+class ScaleAnalysis:
     """
-    Prints a nice description of the given scale.
+    The result of analyzing a scale at a tonic: its spelled notes, the harmonic
+    quality and roman numeral of each degree, the common chords found in it, and
+    the name it matched.  These are built by "analyze" and are immutable.
     """
-    if not scale.has_tonic():
-        # Doesn't matter
-        scale = Scale(scale, tonic="C")
 
-    notes = spelling(scale)
-    scale = Scale(scale, tonic=notes[0])
-    if not scale.name:
-        scale = rename_to_matching_scale(scale)
+    __slots__ = ("mask", "tonic", "scale", "name", "intervals", "notes", "qualities", "degrees", "chords")
+
 
-    degrees = [degree_numeral(i, q) for i, q in enumerate(scale_degree_qualities(scale), 1)]
+    def __init__(self, mask, tonic, scale, name, intervals, notes, qualities, degrees, chords):
+        for field, value in zip(self.__slots__, (mask, tonic, scale, name, intervals, notes, qualities, degrees, chords)):
+            object.__setattr__(self, field, value)
 
-    def pad(m, size=4):
-        m = str(m)
-        add = max(0, size - len(m))
-        left = add // 2
-        right = add - left
-        return (" " * left) + m + (" " * right)
 
-    template = """
+    def __setattr__(self, field, value):
+        raise AttributeError("ScaleAnalysis results are immutable.")
+
+
+    def __repr__(self):
+        return "<{} ScaleAnalysis>".format(self.scale)
+
+
+    def as_dict(self):
+        """
+        Returns a JSON-ready dict of this analysis.
+        """
+        return {
+            "scale": self.scale,
+            "name": self.name,
+            "intervals": self.intervals,
+            "tonic": self.notes[0],
+            "notes": list(self.notes),
+            "qualities": list(self.qualities),
+            "degrees": list(self.degrees),
+            "chords": list(self.chords),
+        }
+
+
+    def text(self):
+        """
+        Returns the description of this analysis printed by "pretty_print".
+        """
+        def pad(m, size=4):
+            m = str(m)
+            add = max(0, size - len(m))
+            left = add // 2
+            right = add - left
+            return (" " * left) + m + (" " * right)
+
+        template = """
 {} ({})
       notes: {}
     degrees: {}
 """
 
-    print(template.format(
-        scale.nice_name,
-        scale.intervals,
-        " ".join(map(pad, notes)),
-        " ".join(map(pad, degrees))))
+        return template.format(
+            self.scale,
+            self.intervals,
+            " ".join(map(pad, self.notes)),
+            " ".join(map(pad, self.degrees)))
+
+
+def analyze_mask(mask):
+    """
+    Returns the parts of a scale's analysis that don't depend on the tonic: its
+    qualities, its degree numerals, and a tuple of (degree, chord name, chord
+    bitmask) for every common chord found on each degree.
+    """
+    qualities = scale_info(mask).qualities
+    degrees = tuple(degree_numeral(i, q) for i, q in enumerate(qualities, 1))
+    index = common_chord_index()
+    chords = tuple(
+        (degree, name, chord_mask(chord))
+        for degree, mode in enumerate(scale_info(mask).modes)
+        for name, chord in index.matches(mode))
+    return qualities, degrees, chords
+
+
+def analyze(scale, shared=None):
+    """
+    Analyzes a scale, and returns the ScaleAnalysis.  Scales without a tonic are
+    analyzed at C.  The tonic-independent work is kept in the "shared" dict if one
+    is given, keyed by scale bitmask.  See "analyze_many".
+    """
+    if not scale.has_tonic():
+        # Doesn't matter
+        scale = Scale(scale, tonic="C")
+    mask = scale.mask
+    if shared is None:
+        parts = analyze_mask(mask)
+    else:
+        parts = shared.get(mask)
+        if parts is None:
+            parts = shared[mask] = analyze_mask(mask)
+    qualities, degrees, found = parts
+
+    notes = spell_scale(mask, scale.tonic)
+    name = scale.name or scale_info(mask).name
+    intervals = scale.intervals
+    chords = sorted({(notes[degree], chord.bit_length(), chord_name, chord) for degree, chord_name, chord in found})
+
+    return ScaleAnalysis(
+        mask,
+        scale.tonic,
+        "{} {}".format(NOTE_NAMES[scale.tonic], name or intervals),
+        name,
+        intervals,
+        notes,
+        qualities,
+        degrees,
+        tuple("{} {}".format(root, chord_name) for root, size, chord_name, chord in chords))
+
+
+def analyze_many(scales):
+    """
+    Yields the ScaleAnalysis of each of a sequence of scales.  Scales that share a
+    bitmask share the work that doesn't depend on the tonic.
+    """
+    shared = {}
+    for scale in scales:
+        yield analyze(scale, shared)
+
+
+def render_text(results, stream):
+    """
+    Writes the "pretty_print" description of each ScaleAnalysis to a stream.
+    """
+    stream.writelines(result.text() + "\n" for result in results)
+
+
+def render_json(results, stream):
+    """
+    Writes each ScaleAnalysis to a stream as one line of JSON.
+    """
+    import json
+    stream.writelines(json.dumps(result.as_dict()) + "\n" for result in results)
+
+
+def render_csv(results, stream):
+    """
+    Writes the ScaleAnalysis results to a stream as CSV w/ a header row.  The notes,
+    qualities, and degrees are separated by spaces, and the chords by "|".
+    """
+    import csv
+    writer = csv.writer(stream)
+    writer.writerow(("scale", "name", "intervals", "tonic", "notes", "qualities", "degrees", "chords"))
+    writer.writerows(
+        (result.scale, result.name or "", result.intervals, result.notes[0], " ".join(result.notes),
+         " ".join(result.qualities), " ".join(result.degrees), "|".join(result.chords))
+        for result in results)
+
+
+# Renderers for "render", keyed by format name.
+RENDERERS = {"text": render_text, "json": render_json, "csv": render_csv}
+
+
+def render(scales, stream, format="text"):
+    """
+    Analyzes a sequence of scales and writes the results to a stream in the given
+    format: "text", "json", or "csv".
+    """
+    RENDERERS[format](analyze_many(scales), stream)
+
+
+def pretty_print(scale):
+    """
+    Prints a nice description of the given scale.
+    """
+    print(analyze(scale).text())
 
 
 def adjacent_scales(scale, turns=3):
@@ -152,10 +274,49 @@ def adjacent_scales(scale, turns=3):
     Returns a list of adjacent scales to the provided scale, ordered by relative
     brightness.
     """
-    scales = []
-    for turn in range(turns, 0, -1):
-        scales.append(sharpen(scale, turn))
-    scales.append(scale)
-    for turn in range(1, turns+1):
-        scales.append(flatten(scale, turn))
-    return tuple(scales)
+    sharper = list(rotations(scale, turns))
+    flatter = list(rotations(scale, -turns))
+    return tuple(sharper[::-1] + [scale] + flatter)
+
+
+def test_analysis():
+    from io import StringIO
+    result = analyze(Scale("Dorian", tonic="D"))
+    assert(result.scale == "D Dorian")
+    assert(result.notes == ("D", "E", "F", "G", "A", "B", "C"))
+    assert(result.degrees == ("i", "ii", "III", "IV", "v", "vi*", "VII"))
+    assert("D Minor 7th" in result.chords)
+    assert(result.chords == tuple(chord.nice_name for chord in sorted(find_chords(Scale("Dorian", tonic="D")))))
+    try:
+        result.name = "Ionian"
+        assert(False)
+    except AttributeError:
+        pass
+
+    major = COMMON_CHORDS["Major 5th"]
+    COMMON_CHORDS["Major 5th"] = Chord(4, 4)
+    try:
+        assert("Major 5th" not in dict(common_chord_index().matches(Scale("Ionian").mask)))
+    finally:
+        COMMON_CHORDS["Major 5th"] = major
+    assert("Major 5th" in dict(common_chord_index().matches(Scale("Ionian").mask)))
+
+    scales = [Scale("Ionian", tonic=tonic) for tonic in range(12)] + [Scale("2122131")]
+    shared = {}
+    results = [analyze(scale, shared) for scale in scales]
+    assert(len(shared) == 2)
+    assert([result.as_dict() for result in analyze_many(scales)] == [result.as_dict() for result in results])
+    assert(results[-1].name == "Harmonic Minor")
+    assert(results[-1].tonic == note_num("C"))
+
+    stream = StringIO()
+    render(scales[:2], stream)
+    assert(stream.getvalue() == results[0].text() + "\n" + results[1].text() + "\n")
+    stream = StringIO()
+    render(scales, stream, "csv")
+    lines = stream.getvalue().splitlines()
+    assert(len(lines) == len(scales) + 1)
+    assert(lines[1].startswith("C Ionian,Ionian,2212221,C,C D E F G A B,Major Minor Minor Major Major Minor Diminished,"))
+    stream = StringIO()
+    render(scales, stream, "json")
+    assert(len(stream.getvalue().splitlines()) == len(scales))
@@ -0,0 +1,216 @@
+#!/usr/bin/python3
+
+from .universe import *
+
+
+def batch_masks(scales):
+    """
+    Converts a sequence of scales into a list of bitmasks.  Each entry may be a
+    bitmask, a keyboard row of 12 or 13 truthy values (such as one row of an
+    (N, 12) boolean array), or a Scale.  Every scale must include the tonic.
+    """
+    masks = []
+    for scale in scales:
+        if type(scale) is Scale:
+            mask = scale.mask
+        else:
+            try:
+                mask = int(scale)
+            except TypeError:
+                mask = keyboard_to_mask(scale[:12])
+        assert(mask & 1)
+        assert(mask <= OCTAVE_MASK)
+        masks.append(mask)
+    return masks
+
+
+def batch_infos(scales):
+    """
+    Returns the list of ScaleInfo records for a sequence of scales.  See "batch_masks"
+    for the accepted inputs.
+    """
+    table = universe()
+    return [table[mask] for mask in batch_masks(scales)]
+
+
+def batch_intervals(scales):
+    """
+    Returns the list of interval strings for a sequence of scales.  This matches
+    "keyboard_to_intervals" for each scale.
+    """
+    intervals = []
+    for info in batch_infos(scales):
+        assert(info.intervals)
+        intervals.append(info.intervals)
+    return intervals
+
+
+def batch_keyboards(intervals):
+    """
+    Returns the list of keyboard tuples for a sequence of interval strings.  This
+    matches "intervals_to_keyboard" for each interval string.
+    """
+    cache = {}
+    keyboards = []
+    for pattern in intervals:
+        keyboard = cache.get(pattern)
+        if keyboard is None:
+            keyboard = cache[pattern] = intervals_to_keyboard(pattern)
+        keyboards.append(keyboard)
+    return keyboards
+
+
+def batch_note_counts(scales):
+    """
+    Returns the number of pitches per octave for each of a sequence of scales.
+    """
+    return [info.note_count for info in batch_infos(scales)]
+
+
+def batch_diatonic(scales):
+    """
+    Returns a list of booleans saying whether each of a sequence of scales is
+    diatonic.
+    """
+    return [info.diatonic for info in batch_infos(scales)]
+
+
+def batch_degree_qualities(scales):
+    """
+    Returns the triad qualities of every degree for each of a sequence of scales.
+    This matches "scale_degree_qualities" for each scale.
+    """
+    return [info.qualities for info in batch_infos(scales)]
+
+
+# The triad qualities in the order of their codes in "array_degree_qualities".
+QUALITY_CODES = ("Augmented", "Major", "Minor", "Diminished", "Unknown")
+
+
+# NumPy lookup tables over every 12-bit mask, keyed by the UNIVERSE versions they
+# were built from.  See "array_tables" below.
+ARRAY_TABLES = []
+
+
+def array_tables():
+    """
+    Returns a dict of NumPy lookup tables indexed by scale bitmask, built from the
+    UNIVERSE table and rebuilt along w/ it.  Even masks have no scale, and are left
+    zeroed.  NumPy is imported here, so the rest of the module works without it.
+    """
+    import numpy
+    table = universe()
+    if ARRAY_TABLES and ARRAY_TABLES[0][0] == UNIVERSE_VERSIONS[0]:
+        return ARRAY_TABLES[0][1]
+    counts = numpy.zeros(OCTAVE_MASK + 1, dtype=numpy.uint8)
+    diatonic = numpy.zeros(OCTAVE_MASK + 1, dtype=bool)
+    intervals = numpy.zeros((OCTAVE_MASK + 1, 12), dtype=numpy.uint8)
+    qualities = numpy.full((OCTAVE_MASK + 1, 12), -1, dtype=numpy.int8)
+    codes = {quality: code for code, quality in enumerate(QUALITY_CODES)}
+    for mask, info in table.items():
+        keys = [key for key in range(12) if mask >> key & 1] + [12]
+        counts[mask] = info.note_count
+        diatonic[mask] = info.diatonic
+        intervals[mask, :info.note_count] = [high - low for low, high in zip(keys, keys[1:])]
+        qualities[mask, :info.note_count] = [codes[quality] for quality in info.qualities]
+    tables = {"counts": counts, "diatonic": diatonic, "intervals": intervals, "qualities": qualities}
+    ARRAY_TABLES[:] = [(UNIVERSE_VERSIONS[0], tables)]
+    return tables
+
+
+def array_masks(scales):
+    """
+    Returns a NumPy array of bitmasks for either an (N, 12) or (N, 13) array of
+    keyboard rows, or an N-length array of bitmasks.  Every scale must include the
+    tonic.
+    """
+    import numpy
+    scales = numpy.asarray(scales)
+    if scales.ndim == 2:
+        weights = numpy.left_shift(1, numpy.arange(12, dtype=numpy.uint16))
+        masks = (scales[:, :12] != 0).astype(numpy.uint16) @ weights
+    else:
+        masks = scales.astype(numpy.uint16)
+    assert((masks & 1).all() and (masks <= OCTAVE_MASK).all())
+    return masks
+
+
+def array_note_counts(scales):
+    """
+    Returns an N-length array of the number of pitches per octave in each scale.
+    See "array_masks" for the accepted inputs.
+    """
+    return array_tables()["counts"][array_masks(scales)]
+
+
+def array_diatonic(scales):
+    """
+    Returns an N-length boolean array saying whether each scale is diatonic.  See
+    "array_masks" for the accepted inputs.
+    """
+    return array_tables()["diatonic"][array_masks(scales)]
+
+
+def array_intervals(scales):
+    """
+    Returns an (N, 12) array of the intervals between the degrees of each scale, in
+    semitones, padded w/ zeros.  The nonzero entries of a row match the digits of
+    "keyboard_to_intervals", and are also given for the scales whose gaps are too
+    large for an interval string.  See "array_masks" for the accepted inputs.
+    """
+    return array_tables()["intervals"][array_masks(scales)]
+
+
+def array_keyboards(intervals):
+    """
+    Returns an (N, 12) boolean array of keyboard rows for an (N, 12) array of
+    intervals padded w/ zeros, as returned by "array_intervals".  This matches
+    "intervals_to_keyboard" for each row, less the repeated octave.
+    """
+    import numpy
+    intervals = numpy.asarray(intervals, dtype=numpy.int64)
+    assert((intervals.sum(axis=1) == 12).all())
+    keys = numpy.cumsum(intervals, axis=1) - intervals
+    rows, degrees = numpy.nonzero(intervals)
+    keyboards = numpy.zeros(intervals.shape, dtype=bool)
+    keyboards[rows, keys[rows, degrees]] = True
+    return keyboards
+
+
+def array_degree_qualities(scales):
+    """
+    Returns an (N, 12) array of the triad quality of every degree of each scale, as
+    indexes into QUALITY_CODES padded w/ -1.  These match "scale_degree_qualities".
+    See "array_masks" for the accepted inputs.
+    """
+    return array_tables()["qualities"][array_masks(scales)]
+
+
+def test_batch():
+    from random import randrange
+    masks = [randrange(1, OCTAVE_MASK + 1, 2) for i in range(64)]
+    rows = [mask_to_keyboard(mask) for mask in masks]
+    assert(batch_masks(rows) == masks)
+    assert(batch_note_counts(masks) == [len(Scale(mask).degree_masks()) for mask in masks])
+    assert(batch_degree_qualities(rows) == [tuple(map(degree_quality, Scale(mask).degree_masks())) for mask in masks])
+    valid = [mask for mask in masks if scale_info(mask).intervals]
+    intervals = batch_intervals(valid)
+    assert(intervals == [keyboard_to_intervals(mask_to_keyboard(mask)) for mask in valid])
+    assert(batch_keyboards(intervals) == [mask_to_keyboard(mask) for mask in valid])
+
+    try:
+        import numpy
+    except ImportError:
+        return
+    masks = numpy.arange(1, OCTAVE_MASK + 1, 2)
+    rows = numpy.array([mask_to_keyboard(mask)[:12] for mask in masks], dtype=bool)
+    assert((array_masks(rows) == masks).all())
+    assert(array_note_counts(rows).tolist() == batch_note_counts(masks.tolist()))
+    assert(array_diatonic(masks).tolist() == batch_diatonic(masks.tolist()))
+    intervals = array_intervals(rows)
+    for mask, row in zip(masks.tolist(), intervals.tolist()):
+        if scale_info(mask).intervals:
+            assert("".join(str(step) for step in row if step) == keyboard_to_intervals(mask_to_keyboard(mask)))
+    assert((array_keyboards(intervals) == rows).all())
+    qualities = array_degree_qualities(rows)
+    assert([tuple(QUALITY_CODES[code] for code in row if code >= 0) for row in qualities.tolist()] == batch_degree_qualities(masks.tolist()))
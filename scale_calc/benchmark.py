@@ -0,0 +1,192 @@
+#!/usr/bin/python3
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+import tracemalloc
+from .analysis import *
+
+
+def benchmark_inputs():
+    """
+    Returns a dict of the inputs used by the benchmarks, covering every keyboard
+    in the universe of scales that include the tonic and can be written as an
+    interval string.
+    """
+    masks = [mask for mask in range(1, OCTAVE_MASK + 1, 2) if scale_info(mask).intervals]
+    keyboards = [mask_to_keyboard(mask) for mask in masks]
+    intervals = [mask_to_intervals(mask) for mask in masks]
+    scales = [Scale(mask, tonic=i % 12) for i, mask in enumerate(masks)]
+    rotatable = [scale for scale in scales
+        if rotation_orbit(SHARPEN_STEPS, SHARPEN_ORBITS, scale.mask)[2] is not None]
+    return {
+        "masks": masks,
+        "keyboards": keyboards,
+        "intervals": intervals,
+        "scales": scales,
+        "rotatable": rotatable,
+        "names": list(COMMON_SCALES),
+    }
+
+
+def benchmark_cases(inputs):
+    """
+    Returns a dict of benchmark names to (function, number of operations) pairs.
+    Each function runs its operation once per input.
+    """
+    masks = inputs["masks"]
+    keyboards = inputs["keyboards"]
+    intervals = inputs["intervals"]
+    scales = inputs["scales"]
+    rotatable = inputs["rotatable"]
+    names = inputs["names"]
+
+    def each(function, args):
+        return lambda: [function(arg) for arg in args], len(args)
+
+    return {
+        "Scale(intervals)": each(Scale, intervals),
+        "Scale(keyboard)": each(Scale, keyboards),
+        "Scale(mask)": each(Scale, masks),
+        "Scale(scale)": each(Scale, scales),
+        "Scale(name)": each(Scale, names),
+        "intervals_to_keyboard": each(intervals_to_keyboard, intervals),
+        "keyboard_to_intervals": each(keyboard_to_intervals, keyboards),
+        "spelling": each(spelling, scales),
+        "scale_degree_qualities": each(lambda scale: list(scale_degree_qualities(scale)), scales),
+        "find_chords": each(find_chords, scales),
+        "rotate(+1000)": each(lambda scale: rotate(scale, 1000), rotatable),
+        "rotate(-1000)": each(lambda scale: rotate(scale, -1000), scales),
+        "adjacent_scales": each(adjacent_scales, rotatable),
+    }
+
+
+def run_benchmarks(repeat=3, only=None):
+    """
+    Runs the benchmarks, and returns a dict of benchmark names to results.  Each
+    result has the best operations per second over "repeat" runs, and the peak
+    number of bytes allocated per operation while running.
+    """
+    cases = benchmark_cases(benchmark_inputs())
+    results = {}
+    for name, (function, count) in cases.items():
+        if only and only not in name:
+            continue
+        function()
+        best = None
+        for run in range(repeat):
+            start = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        tracemalloc.start()
+        function()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[name] = {
+            "ops_per_sec": count / best,
+            "bytes_per_op": peak / count,
+        }
+    return results
+
+
+def import_time(module="analysis", repeat=5):
+    """
+    Returns the best time in seconds, over "repeat" fresh interpreters, taken to
+    import a module of this package, including everything it imports.
+    """
+    module = "{}.{}".format(__package__, module)
+    best = None
+    for run in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import " + module],
+            stderr=subprocess.PIPE, text=True, check=True).stderr
+        for line in output.splitlines():
+            fields = line.split("|")
+            if len(fields) == 3 and fields[2].strip() == module:
+                seconds = int(fields[1]) / 1e6
+                best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def compare_benchmarks(results, baseline, tolerance):
+    """
+    Returns a list of messages for every benchmark that ran slower than its baseline
+    by more than the given fraction.
+    """
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if not expected:
+            continue
+        floor = expected["ops_per_sec"] * (1 - tolerance)
+        if result["ops_per_sec"] < floor:
+            regressions.append("{}: {:.0f} ops/sec, baseline {:.0f} ops/sec".format(
+                name, result["ops_per_sec"], expected["ops_per_sec"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m scale_calc.benchmark",
+        description="Time the hot paths of scale_calc over every scale keyboard.")
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+        help="timed runs per benchmark, the best is kept (default: 3)")
+    parser.add_argument("-k", "--only", default=None,
+        help="only run benchmarks whose name contains this string")
+    parser.add_argument("--save", metavar="PATH",
+        help="write the results to this file as a new baseline")
+    parser.add_argument("--baseline", metavar="PATH",
+        help="compare the results against a baseline file saved w/ --save on the same "
+            "machine, and fail on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+        help="fraction slower than the baseline that counts as a regression (default: 0.25)")
+    parser.add_argument("--import-budget", type=float, default=20.0, metavar="MS",
+        help="most milliseconds importing scale_calc.analysis may take (default: 20)")
+    args = parser.parse_args(argv)
+
+    failed = False
+    seconds = import_time()
+    print("{:<24} {:>14,.2f} ms".format("import analysis", seconds * 1000))
+    if seconds * 1000 > args.import_budget:
+        print("\nIMPORT OVER BUDGET: {:.2f} ms, budget {:.2f} ms".format(
+            seconds * 1000, args.import_budget), file=sys.stderr)
+        failed = True
+
+    results = run_benchmarks(args.repeat, args.only)
+    for name, result in results.items():
+        print("{:<24} {:>14,.0f} ops/sec {:>10,.0f} bytes/op".format(
+            name, result["ops_per_sec"], result["bytes_per_op"]))
+
+    if args.save:
+        with open(args.save, "w") as outfile:
+            json.dump(results, outfile, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as infile:
+            baseline = json.load(infile)
+        regressions = compare_benchmarks(results, baseline, args.tolerance)
+        if regressions:
+            print("\nREGRESSIONS:", file=sys.stderr)
+            for message in regressions:
+                print("  " + message, file=sys.stderr)
+            failed = True
+
+    if failed:
+        sys.exit(1)
+
+
+def test_benchmark():
+    baseline = {name: {"ops_per_sec": 1000.0, "bytes_per_op": 100.0} for name in benchmark_cases(benchmark_inputs())}
+    results = {name: {"ops_per_sec": expected["ops_per_sec"] * 0.9, "bytes_per_op": 0} for name, expected in baseline.items()}
+    assert(compare_benchmarks(results, baseline, 0.25) == [])
+    results["find_chords"]["ops_per_sec"] = baseline["find_chords"]["ops_per_sec"] * 0.5
+    results["unknown"] = {"ops_per_sec": 1, "bytes_per_op": 0}
+    regressions = compare_benchmarks(results, baseline, 0.25)
+    assert(len(regressions) == 1 and regressions[0].startswith("find_chords: "))
+
+
+if __name__ == "__main__":
+    main()
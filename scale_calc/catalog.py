@@ -0,0 +1,295 @@
+#!/usr/bin/python3
+
+import math
+import os
+from .universe import *
+
+
+def mode_class(mask):
+    """
+    Returns the id of the mode class of a scale bitmask, which is the least of the
+    bitmasks of its modes.  Two scales are modes of each other if and only if they
+    have the same mode class.
+    """
+    return min(scale_info(mask).modes)
+
+
+class ScaleCatalog:
+    """
+    A collection of named scales, indexed by bitmask and by mode class so that any
+    scale can be named in constant time regardless of the size of the catalog.
+
+    Each scale has one primary name and any number of aliases.  Names are matched
+    case insensitively, same as with COMMON_SCALES.  Scales can be added one at a
+    time with "add", or in bulk from a file with "load".
+
+    Every scale is also indexed at each of the 12 tonics by the absolute pitch
+    classes it covers, so the scales containing a set of notes are found with one
+    bitset intersection per note.  See "supersets".
+    """
+
+    __slots__ = ("__scales", "__by_mask", "__by_mode_class", "__placements", "__by_pitch")
+
+
+    def __init__(self, scales=()):
+        self.__scales = {}
+        self.__by_mask = {}
+        self.__by_mode_class = {}
+        # (tonic, mask) pairs, and a bitset over them for each absolute pitch class.
+        self.__placements = []
+        self.__by_pitch = [0] * 12
+        for name, pattern in scales:
+            self.add(name, pattern)
+
+
+    def __len__(self):
+        return len(self.__scales)
+
+
+    def __iter__(self):
+        return iter(self.__scales)
+
+
+    def __contains__(self, name):
+        return name.title() in self.__scales
+
+
+    def add(self, name, pattern, aliases=()):
+        """
+        Adds a scale to the catalog under the given name and aliases.  The pattern
+        can be anything the Scale constructor accepts.  Names already in the catalog
+        are left alone.  Returns True if any of the names were added.
+        """
+        mask = Scale(pattern).mask
+        names = self.__by_mask.setdefault(mask, [])
+        indexed = bool(names)
+        added = []
+        for alias in (name,) + tuple(aliases):
+            alias = alias.title()
+            if alias in self.__scales:
+                continue
+            self.__scales[alias] = Scale(mask, name=alias)
+            names.append(alias)
+            added.append(alias)
+        if not added:
+            return False
+        if not indexed:
+            self.__index(mask)
+        self.__by_mode_class.setdefault(mode_class(mask), []).append(added[0])
+        return True
+
+
+    def __index(self, mask):
+        for tonic in range(12):
+            bit = 1 << len(self.__placements)
+            self.__placements.append((tonic, mask))
+            pitches = rotate_mask(mask, -tonic)
+            for pitch in range(12):
+                if pitches >> pitch & 1:
+                    self.__by_pitch[pitch] |= bit
+
+
+    def supersets(self, pitches):
+        """
+        Yields a (tonic, mask) pair for every scale in the catalog, at every tonic,
+        that contains the given bitmask of absolute pitch classes (bit 0 = C).
+        """
+        found = (1 << len(self.__placements)) - 1
+        for pitch in range(12):
+            if pitches >> pitch & 1:
+                found &= self.__by_pitch[pitch]
+        while found:
+            low = found & -found
+            yield self.__placements[low.bit_length() - 1]
+            found ^= low
+
+
+    def get(self, name):
+        """
+        Returns the Scale for the given name, or None if it is not in the catalog.
+        """
+        return self.__scales.get(name.title())
+
+
+    def names(self, mask):
+        """
+        Returns a tuple of every name in the catalog for the given scale bitmask.
+        """
+        return tuple(self.__by_mask.get(mask, ()))
+
+
+    def name(self, mask):
+        """
+        Returns the first name in the catalog for the given scale bitmask, or None.
+        """
+        names = self.__by_mask.get(mask)
+        return names[0] if names else None
+
+
+    def modes(self, mask):
+        """
+        Returns a tuple of the primary names of every scale in the catalog that is a
+        mode of the given scale bitmask, including the scale itself.
+        """
+        return tuple(self.__by_mode_class.get(mode_class(mask), ()))
+
+
+    def install(self):
+        """
+        Adds every scale in this catalog to COMMON_SCALES, so that they may be used
+        by name with the Scale constructor and are matched by the analysis functions.
+        Names that are already in COMMON_SCALES are left alone.
+        """
+        for name, scale in self.__scales.items():
+            COMMON_SCALES.setdefault(name, scale)
+
+
+    def load(self, path):
+        """
+        Bulk loads scales from a file.  The format is picked by the file extension:
+
+        ".json" - either an object mapping names to interval strings, or a list of
+        objects with "name", "intervals" and optionally "aliases" keys.
+
+        ".csv" - rows of name, interval string, and optionally a column of aliases
+        separated by "|".  Blank rows, rows starting with "#", and a header row
+        starting with "name" are skipped.
+
+        ".scl" - a Scala scale file.  Only scales that fit 12-tone equal temperament
+        within a cent can be loaded.
+
+        Returns the number of scales added.
+        """
+        # These are imported here to keep them out of the package's import time.
+        import json
+        ext = os.path.splitext(path)[1].lower()
+        with open(path, newline="") as infile:
+            if ext == ".json":
+                rows = json_scales(json.load(infile))
+            elif ext == ".csv":
+                rows = csv_scales(infile)
+            elif ext == ".scl":
+                rows = [scala_scale(infile)]
+            else:
+                raise ValueError("Unknown scale catalog format: {}".format(path))
+            count = 0
+            for name, pattern, aliases in rows:
+                if self.add(name, pattern, aliases):
+                    count += 1
+        return count
+
+
+def json_scales(data):
+    """
+    Yields (name, intervals, aliases) triples from parsed JSON catalog data.
+    """
+    if type(data) is dict:
+        data = [{"name": name, "intervals": intervals} for name, intervals in data.items()]
+    for entry in data:
+        yield entry["name"], entry["intervals"], tuple(entry.get("aliases", ()))
+
+
+def csv_scales(infile):
+    """
+    Yields (name, intervals, aliases) triples from the rows of a CSV catalog file.
+    """
+    import csv
+    source = getattr(infile, "name", "CSV catalog")
+    reader = csv.reader(infile)
+    for row in reader:
+        row = [cell.strip() for cell in row]
+        if not row or not row[0] or row[0].startswith("#") or row[0].lower() == "name":
+            continue
+        if len(row) < 2 or not row[1]:
+            raise ValueError("{} line {}: {} has no interval string.".format(source, reader.line_num, row[0]))
+        aliases = ()
+        if len(row) > 2 and row[2]:
+            aliases = tuple(alias.strip() for alias in row[2].split("|"))
+        yield row[0], row[1], aliases
+
+
+def scala_scale(infile):
+    """
+    Parses a Scala scale file, and returns a (name, intervals, aliases) triple.
+    """
+    lines = [line.strip() for line in infile if not line.startswith("!")]
+    name = lines[0]
+    count = int(lines[1].split()[0])
+    keys = [0]
+    for line in lines[2:2 + count]:
+        pitch = line.split()[0]
+        if "." in pitch:
+            cents = float(pitch)
+        else:
+            num, den = (pitch.split("/") + ["1"])[:2]
+            cents = 1200 * math.log2(int(num) / int(den))
+        key = round(cents / 100)
+        if abs(cents - key * 100) > 1:
+            raise ValueError("{} is not a 12-tone equal tempered scale.".format(name))
+        keys.append(key)
+    if keys[-1] != 12:
+        raise ValueError("{} does not span an octave.".format(name))
+    intervals = [high - low for low, high in zip(keys, keys[1:])]
+    return name, "".join(map(str, intervals)), ()
+
+
+# ScaleCatalog of COMMON_SCALES.  See "common_catalog" below.
+COMMON_CATALOG = []
+
+
+def common_catalog():
+    """
+    Returns a ScaleCatalog of COMMON_SCALES.  The catalog is rebuilt whenever
+    COMMON_SCALES has been changed.  See "LazyDict.version".
+    """
+    if not COMMON_CATALOG or COMMON_CATALOG[0][0] != COMMON_SCALES.version:
+        COMMON_CATALOG[:] = [(COMMON_SCALES.version, ScaleCatalog(COMMON_SCALES.items()))]
+    return COMMON_CATALOG[0][1]
+
+
+def test_catalog():
+    import json
+    from tempfile import TemporaryDirectory
+    with TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "scales.csv")
+        with open(path, "w") as outfile:
+            outfile.write("name,intervals,aliases\nHirajoshi,21414,Hira|Japanese\n")
+        catalog = ScaleCatalog()
+        assert(catalog.load(path) == 1)
+        placements = list(catalog.supersets(0))
+        assert(catalog.load(path) == 0)
+        assert(list(catalog.supersets(0)) == placements and len(placements) == 12)
+        assert(catalog.names(Scale("21414").mask) == ("Hirajoshi", "Hira", "Japanese"))
+        assert(catalog.modes(Scale("21414").mask) == ("Hirajoshi",))
+        assert(not catalog.add("Hira", "14142") and catalog.modes(Scale("21414").mask) == ("Hirajoshi",))
+        assert(list(catalog.supersets(0)) == placements)
+        assert(not catalog.add("Hirajoshi", "21414", ("Japanese",)))
+
+        path = os.path.join(tmp, "scales.json")
+        with open(path, "w") as outfile:
+            json.dump([{"name": "Ryukyu", "intervals": "41214"}], outfile)
+        assert(catalog.load(path) == 1)
+
+        path = os.path.join(tmp, "hijaz.scl")
+        with open(path, "w") as outfile:
+            outfile.write("! hijaz.scl\nHijaz\n 7\n!\n100.0\n400.0\n500.0\n700.0\n800.0\n1000.0\n2/1\n")
+        assert(catalog.load(path) == 1)
+
+        path = os.path.join(tmp, "bad.csv")
+        with open(path, "w") as outfile:
+            outfile.write("Kumoi,23241\nHirajoshi\n")
+        try:
+            ScaleCatalog().load(path)
+        except ValueError as error:
+            assert("bad.csv line 2: Hirajoshi" in str(error))
+        else:
+            assert(False)
+
+    assert(catalog.names(Scale("21414").mask) == ("Hirajoshi", "Hira", "Japanese"))
+    assert(catalog.name(Scale("HWHWHWHW").mask) == None)
+    assert(catalog.get("hijaz").intervals == "1312122")
+    assert(catalog.modes(Scale("14142").mask) == ("Hirajoshi",))
+    found = set(catalog.supersets(1 << note_num("C") | 1 << note_num("E")))
+    assert(found == {(tonic, mask) for tonic in range(12) for mask in {catalog.get(name).mask for name in catalog} if rotate_mask(mask, -tonic) & 0b10001 == 0b10001})
+    assert(common_catalog().name(Scale("WWHWWWH").mask) == "Ionian")
+    assert(common_catalog().modes(Scale("Locrian").mask)[0] == "Ionian")
@@ -1,18 +1,18 @@
 #!/usr/bin/python3
 
-from enum import Enum
 from .scales import *
 
 
-# This will be prepopulated with common chords.  See "populate_common_chords" below.
-COMMON_CHORDS = {}
+# This will be populated with common chords on first use.  See "populate_common_chords" below.
+COMMON_CHORDS = LazyDict()
 
 
 class Chord:
     """
-    Represents a chord.  Internally this is represented by a tuple of 0s and 1s that
-    represents the keyboard's state starting at the chord's root.  This should make it
-    compatible with the Scale objects for a number of things.
+    Represents a chord.  Internally this is represented by a bitmask where bit "n" is
+    set if the key "n" semitones above the chord's root is pressed.  The "keyboard"
+    attribute presents this as a tuple of 0s and 1s starting at the chord's root,
+    which should make it compatible with the Scale objects for a number of things.
 
     Chords take any number of positional parameters upon construction.  If a param is
     an integer, then it will be treated as a chord with two notes where the second note
@@ -26,17 +26,22 @@ class Chord:
     will use that automatically.
     """
 
+    __slots__ = ("__root", "__name", "__mask")
+
+
     def __init__(self, *params, name=None, root=None):
         self.__root = root
         self.__name = name
-        self.__keyboard = (1,)
+        mask = 1
         for param in params:
-            if param in COMMON_CHORDS.keys():
-                param = COMMON_CHORDS.get(param)
+            if type(param) is str and param in COMMON_CHORDS:
+                param = COMMON_CHORDS[param]
+            top = mask.bit_length() - 1
             if type(param) == int:
-                self.__keyboard += (0,) * (param - 1) + (1,)
+                mask |= 1 << (top + param)
             else:
-                self.__keyboard += param.keyboard[1:]
+                mask |= (chord_mask(param) & ~1) << top
+        self.__mask = mask
 
 
     @property
@@ -49,9 +54,15 @@ class Chord:
         return self.__name
 
 
+    @property
+    def mask(self):
+        return self.__mask
+
+
     @property
     def keyboard(self):
-        return self.__keyboard
+        mask = self.__mask
+        return tuple([mask >> key & 1 for key in range(mask.bit_length())])
 
 
     @property
@@ -68,7 +79,7 @@ class Chord:
 
 
     def order(self):
-        return (self.root, len(self.keyboard), self.name, self.keyboard)
+        return (self.root, self.__mask.bit_length(), self.name, self.__mask)
 
 
     def __hash__(self):
@@ -95,27 +106,147 @@ class Chord:
         return self.order() >= other.order()
 
 
-def compare_chords(lhs, rhs):
+def chord_mask(chord):
     """
-    Take two chords or chord-like objects and compare them.
-    The return result is a pair of floats that say how much one was like the value.
+    Returns the bitmask for a chord or chord-like object.  This accepts Chord and
+    Scale objects, keyboard tuples, and bitmasks.  Scales include the repeated tonic
+    at the top of the octave, same as their keyboard tuples.
     """
+    if type(chord) is Chord:
+        return chord.mask
+    if type(chord) is Scale:
+        return chord.mask | 1 << 12
+    if type(chord) is int:
+        return chord
     try:
-        lhs = lhs.keyboard
-    except AttributeError:
-        pass
-    try:
-        rhs = rhs.keyboard
+        chord = chord.keyboard
     except AttributeError:
         pass
-    lhs_pad = max(len(rhs) - len(lhs), 0)
-    rhs_pad = max(len(lhs) - len(rhs), 0)
-    lhs += (0,) * lhs_pad
-    rhs += (0,) * rhs_pad
-    lhs_pressed = sum(lhs)
-    rhs_pressed = sum(rhs)
-    parity = sum(map(lambda x: (x[0] & x[1]), zip(lhs, rhs)))
-    return parity/lhs_pressed, parity/rhs_pressed
+    return keyboard_to_mask(chord)
+
+
+def fold_mask(mask):
+    """
+    Folds a chord's bitmask into a single octave, returning the bitmask of the pitch
+    classes it covers relative to the root.
+    """
+    folded = 0
+    while mask:
+        folded |= mask & OCTAVE_MASK
+        mask >>= 12
+    return folded
+
+
+def compare_chords(lhs, rhs):
+    """
+    Take two chords or chord-like objects and compare them.
+    The return result is a pair of floats that say how much one was like the value.
+    """
+    lhs = chord_mask(lhs)
+    rhs = chord_mask(rhs)
+    parity = (lhs & rhs).bit_count()
+    return parity/lhs.bit_count(), parity/rhs.bit_count()
+
+
+def triad_quality(keyboard):
+    """
+    Attempt to determine the harmonic quality of a triad.  The keyboard may be a
+    keyboard tuple or a bitmask rooted on the triad's root.
+    """
+    mask = chord_mask(keyboard)
+    qualities = ("Augmented", "Major", "Minor", "Diminished")
+    for quality in qualities:
+        chord = COMMON_CHORDS[quality + " 5th"].mask
+        if mask & chord == chord:
+            return quality
+    return "Unknown"
+
+
+def degree_quality(keyboard):
+    """
+    Returns the harmonic quality of the triad on a scale degree.  The keyboard may
+    be a keyboard tuple or a bitmask rooted on the degree, covering one octave.
+
+    In a heptatonic scale, the triad is stacked from alternate notes of the
+    degree's mode: the 1st, 3rd and 5th.  In smaller and larger scales alternate
+    notes aren't thirds apart, so the quality is the one "triad_quality" reports.
+    """
+    mask = chord_mask(keyboard) & OCTAVE_MASK
+    if mask.bit_count() != 7:
+        return triad_quality(mask)
+    keys = [key for key in range(12) if mask >> key & 1]
+    triad = 1 | 1 << keys[2] | 1 << keys[4]
+    for quality in ("Augmented", "Major", "Minor", "Diminished"):
+        if COMMON_CHORDS[quality + " 5th"].mask == triad:
+            return quality
+    return "Unknown"
+
+
+class ChordIndex:
+    """
+    An index over a mapping of chord names to Chord objects, used to find every chord
+    that fits within a scale degree.  The chords are grouped by the pitch classes they
+    cover, so a degree's matches are found by probing the subsets of its bitmask
+    rather than by comparing against every chord.  Matches are memoized per mask.
+
+    Chords spanning two octaves or more can never fit a doubled scale keyboard, and
+    are left out of the index.
+    """
+
+    __slots__ = ("__templates", "__matches")
+
+
+    def __init__(self, chords):
+        templates = {}
+        for name, chord in chords.items():
+            mask = chord_mask(chord)
+            if mask.bit_length() > 24:
+                continue
+            folded = (mask | mask >> 12) & OCTAVE_MASK
+            templates.setdefault(folded, []).append((name, chord))
+        self.__templates = {folded: tuple(found) for folded, found in templates.items()}
+        self.__matches = {}
+
+
+    def matches(self, mask):
+        """
+        Returns a tuple of (name, chord) pairs for every indexed chord that fits within
+        the scale degree represented by the given bitmask.  The mask is rooted on the
+        degree, same as the ones returned by "Scale.degree_masks".
+        """
+        try:
+            return self.__matches[mask]
+        except KeyError:
+            pass
+        found = []
+        rest = mask & OCTAVE_MASK & ~1
+        if len(self.__templates) < 1 << rest.bit_count():
+            for folded, chords in self.__templates.items():
+                if folded & mask == folded:
+                    found.extend(chords)
+        else:
+            subset = rest
+            while True:
+                found.extend(self.__templates.get(subset | 1, ()))
+                if not subset:
+                    break
+                subset = (subset - 1) & rest
+        found = self.__matches[mask] = tuple(found)
+        return found
+
+
+# The ChordIndex for COMMON_CHORDS.  See "common_chord_index" below.
+COMMON_CHORD_INDEX = []
+
+
+def common_chord_index():
+    """
+    Returns the ChordIndex for COMMON_CHORDS.  The index is rebuilt whenever
+    COMMON_CHORDS has been changed.  See "LazyDict.version".
+    """
+    if not COMMON_CHORD_INDEX or COMMON_CHORD_INDEX[0][0] != COMMON_CHORDS.version:
+        COMMON_CHORD_INDEX[:] = [(COMMON_CHORDS.version, ChordIndex(COMMON_CHORDS))]
+    return COMMON_CHORD_INDEX[0][1]
 
 
 def populate_common_chords():
@@ -148,5 +279,5 @@ def populate_common_chords():
         COMMON_CHORDS[car] = Chord(*cdr, name=car)
 
 
-populate_common_chords()
+COMMON_CHORDS.defer(populate_common_chords)
 del populate_common_chords
@@ -0,0 +1,116 @@
+#!/usr/bin/python3
+
+import argparse
+import json
+import sys
+from itertools import islice
+from multiprocessing import Pool
+from .flyweight import *
+
+
+def spec_scale(spec):
+    """
+    Builds a Scale from a parsed NDJSON scale spec.  A spec is an object with an
+    "intervals" key holding either an interval string or the name of a common scale,
+    and optionally "tonic" and "name" keys.
+    """
+    if type(spec) is str:
+        spec = {"intervals": spec}
+    return Scale(spec["intervals"], tonic=spec.get("tonic"), name=spec.get("name"))
+
+
+def describe(scale):
+    """
+    Returns a JSON-ready dict describing the given scale, with the same information
+    as "pretty_print" plus the chords found in the scale.  See "cached_analyze".
+    """
+    return cached_analyze(scale).as_dict()
+
+
+def analyze_line(job):
+    """
+    Analyzes one numbered line of NDJSON input, and returns one line of NDJSON
+    output.  Malformed input produces an "error" record rather than an exception.
+    """
+    number, line = job
+    try:
+        result = describe(spec_scale(json.loads(line)))
+    except (AssertionError, KeyError, TypeError, ValueError) as error:
+        result = {"error": "{}: {}".format(type(error).__name__, error)}
+    result["line"] = number
+    return json.dumps(result)
+
+
+def numbered_lines(infile):
+    """
+    Yields (line number, text) pairs for the non-blank lines of a file.
+    """
+    for number, line in enumerate(infile, 1):
+        if line.strip():
+            yield number, line
+
+
+def main(argv=None, stdin=None, stdout=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m scale_calc",
+        description="Analyze scale specs read as NDJSON, and write the results as NDJSON.")
+    parser.add_argument("input", nargs="?", default="-",
+        help="file of scale specs, one JSON object per line (default: stdin)")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+        help="number of worker processes (default: 1, no pool)")
+    parser.add_argument("-b", "--batch", type=int, default=4096,
+        help="most lines held in memory at once (default: 4096)")
+    parser.add_argument("-u", "--unordered", action="store_true",
+        help="with --jobs, write each batch's results as they finish rather than in "
+             "input order (batches are still written in order)")
+    args = parser.parse_args(argv)
+    if args.batch < 1:
+        parser.error("--batch must be at least 1")
+
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    infile = stdin if args.input == "-" else open(args.input)
+    pool = Pool(args.jobs) if args.jobs > 1 else None
+    try:
+        lines = numbered_lines(infile)
+        while True:
+            batch = list(islice(lines, args.batch))
+            if not batch:
+                break
+            if pool is None:
+                results = map(analyze_line, batch)
+            else:
+                chunk = max(1, len(batch) // (args.jobs * 4))
+                imap = pool.imap_unordered if args.unordered else pool.imap
+                results = imap(analyze_line, batch, chunk)
+            for result in results:
+                stdout.write(result + "\n")
+            stdout.flush()
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if infile is not stdin:
+            infile.close()
+
+
+def test_cli():
+    from io import StringIO
+    stdin = StringIO('{"intervals": "Dorian", "tonic": "D"}\n\n"2122131"\n{"intervals": "22"}\n')
+    stdout = StringIO()
+    main(["-b", "2"], stdin, stdout)
+    results = list(map(json.loads, stdout.getvalue().splitlines()))
+    assert([result["line"] for result in results] == [1, 3, 4])
+    assert(results[0]["scale"] == "D Dorian")
+    assert(results[0]["degrees"] == ["i", "ii", "III", "IV", "v", "vi*", "VII"])
+    assert(results[1]["name"] == "Harmonic Minor")
+    assert("error" in results[2])
+
+    from contextlib import redirect_stderr
+    with redirect_stderr(StringIO()):
+        try:
+            main(["-b", "0"], StringIO('"2122131"\n'), StringIO())
+        except SystemExit:
+            pass
+        else:
+            assert(False)
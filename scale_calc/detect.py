@@ -0,0 +1,190 @@
+#!/usr/bin/python3
+
+from collections import deque
+from heapq import heapify, heappush, heapreplace
+from .catalog import *
+
+
+# Durations are counted in whole ticks, this many to a unit of duration, so that the
+# window's sums stay exact however long the stream runs.
+DETECT_TICKS = 960
+
+
+# A multiple of every scale size, so "sounding notes / scale size" can be compared
+# exactly as an integer.
+SIZE_MULTIPLE = 27720
+
+
+class KeyDetector:
+    """
+    Detects the scale and tonic of a stream of notes.  The detector keeps a
+    pitch class histogram over a sliding window of the last "window" notes, each
+    weighted by its duration, and reports the best matching scale after every note.
+
+    Candidates are scored like "compare_chords": first by how much of the window's
+    weight falls within the scale, then by how many of the scale's notes are
+    sounding, then by the weight on the tonic.  Durations are rounded to whole
+    ticks (see DETECT_TICKS).  The per-candidate sums are updated incrementally,
+    so a note costs the same no matter how long the stream is, and only the
+    candidates containing the note are touched.  Candidates whose score goes up are
+    pushed onto a heap ordered by score, and entries left stale by a note leaving
+    the window are re-keyed once they reach the top, so the best candidate is found
+    w/o scanning them all.
+
+    Candidates are taken from a ScaleCatalog (COMMON_SCALES by default) at every
+    tonic.  With "universe" set, every scale that includes the tonic is a
+    candidate instead, and the best match is found directly from the set of
+    sounding notes.
+    """
+
+    __slots__ = ("window", "__events", "__weights", "__counts", "__total",
+        "__candidates", "__members", "__scores", "__sounding", "__universe", "__best", "__heap")
+
+
+    def __init__(self, window=32, catalog=None, universe=False):
+        self.window = window
+        self.__events = deque()
+        self.__weights = [0] * 12
+        self.__counts = [0] * 12
+        self.__total = 0
+        self.__universe = universe
+        self.__best = None
+        self.__candidates = []
+        self.__members = [[] for note in range(12)]
+        if not universe:
+            catalog = catalog or common_catalog()
+            for name in catalog:
+                mask = catalog.get(name).mask
+                if name != catalog.name(mask):
+                    continue
+                for tonic in range(12):
+                    index = len(self.__candidates)
+                    self.__candidates.append((tonic, mask, name, mask.bit_count()))
+                    pitches = rotate_mask(mask, -tonic)
+                    for note in range(12):
+                        if pitches >> note & 1:
+                            self.__members[note].append(index)
+        self.__scores = [0] * len(self.__candidates)
+        self.__sounding = [0] * len(self.__candidates)
+        self.__heap = [self.__key(index) for index in range(len(self.__candidates))]
+        heapify(self.__heap)
+
+
+    def reset(self):
+        """
+        Forgets every note heard so far.
+        """
+        while self.__events:
+            self.__remove(*self.__events.popleft())
+        self.__best = None
+
+
+    def __key(self, index):
+        """
+        Returns the heap entry for a candidate, which sorts the best candidate first.
+        """
+        tonic, mask, name, size = self.__candidates[index]
+        return (
+            -self.__scores[index],
+            -self.__sounding[index] * SIZE_MULTIPLE // size,
+            -self.__weights[tonic],
+            index)
+
+
+    def __update(self, note, weight, change):
+        self.__weights[note] += weight
+        self.__total += weight
+        self.__counts[note] += change
+        scores = self.__scores
+        members = self.__members[note]
+        for index in members:
+            scores[index] += weight
+        if self.__counts[note] == (change > 0):
+            sounding = self.__sounding
+            for index in members:
+                sounding[index] += change
+        if change < 0:
+            return
+        heap = self.__heap
+        if len(heap) > 4 * len(scores) + 64:
+            heap[:] = [self.__key(index) for index in range(len(scores))]
+            heapify(heap)
+        else:
+            for index in members:
+                heappush(heap, self.__key(index))
+
+
+    def __add(self, note, weight):
+        self.__update(note, weight, 1)
+
+
+    def __remove(self, note, weight):
+        self.__update(note, -weight, -1)
+
+
+    def feed(self, note, duration=1.0):
+        """
+        Adds a note to the window, and returns the best matching Scale with its
+        tonic set.
+        """
+        note = note_num(note)
+        weight = round(duration * DETECT_TICKS)
+        assert(weight >= 0)
+        self.__events.append((note, weight))
+        self.__add(note, weight)
+        if len(self.__events) > self.window:
+            self.__remove(*self.__events.popleft())
+        return self.best()
+
+
+    def best(self):
+        """
+        Returns the best matching Scale for the notes in the window, or None if no
+        notes have been heard.
+        """
+        if not self.__events:
+            return None
+        if self.__universe:
+            weights = self.__weights
+            tonic = max(range(12), key=lambda note: (self.__counts[note] > 0, weights[note], -note))
+            pitches = sum(1 << note for note in range(12) if self.__counts[note])
+            mask = rotate_mask(pitches, tonic)
+            return Scale(mask, tonic=tonic, name=scale_info(mask).name)
+        heap = self.__heap
+        while True:
+            key = self.__key(heap[0][-1])
+            if heap[0] == key:
+                break
+            heapreplace(heap, key)
+        best = key[-1]
+        if self.__best is None or self.__best[0] != best:
+            tonic, mask, name, size = self.__candidates[best]
+            self.__best = (best, Scale(mask, tonic=tonic, name=name))
+        return self.__best[1]
+
+
+def test_detect():
+    detector = KeyDetector(window=8)
+    for note in ["D", "E", "F#", "G", "A", "B", "C#", "D"]:
+        found = detector.feed(note)
+    assert(found.nice_name == "D Ionian")
+    for note in ["E", "G", "B", "A", "F#", "D", "C", "E"]:
+        found = detector.feed(note)
+    assert(found.nice_name == "E Aeolian")
+
+    from random import choice, randrange
+    window = ["C", "E", "G", "C", "E", "G", "C", "E"]
+    detector = KeyDetector(window=8)
+    for step in range(2000):
+        detector.feed(randrange(12), choice((0.1, 0.3, 0.7)))
+    for note in window:
+        found = detector.feed(note, 0.3)
+    fresh = KeyDetector(window=8)
+    for note in window:
+        expected = fresh.feed(note, 0.3)
+    assert(found.nice_name == expected.nice_name == "C Ionian")
+    detector = KeyDetector(window=4, universe=True)
+    for note in [60, 64, 67, 64]:
+        found = detector.feed(note)
+    assert(found.intervals == "354")
+    assert(found.tonic == note_num("E"))
@@ -0,0 +1,338 @@
+#!/usr/bin/python3
+
+import math
+import re
+from .scales import *
+
+
+# Matches interval lists written with separators, such as "3,3,2,3,3,3,2".
+INTERVAL_LIST_PATTERN = re.compile(r"^\s*\d+(\s*[, ]\s*\d+)*\s*$")
+
+
+# How many entries each of an EDO's memos of steps and orbits around the circle of
+# the generator holds.
+EDO_CACHE_SIZE = 4096
+
+
+class EDO:
+    """
+    An equal division of the octave into "steps" keys, such as 19, 24, 31 or 53.
+    Scales are bitmasks where bit "n" is set if the key "n" steps above the tonic is
+    in the scale, same as with the 12-tone Scale class, and may be any size.
+
+    The "generator" is the interval used to walk the circle of fifths, and defaults
+    to the closest approximation of a just perfect fifth.  EDO(12) reproduces the
+    12-tone functions in this package exactly.
+
+    Steps and orbits around the circle of the generator are memoized in LRUCaches
+    of "cache_size" entries each.
+    """
+
+    __slots__ = ("steps", "generator", "full", "__sharpen", "__flatten", "__sharpen_orbits", "__flatten_orbits")
+
+
+    def __init__(self, steps=12, generator=None, cache_size=EDO_CACHE_SIZE):
+        assert(type(steps) == int and steps > 1)
+        self.steps = steps
+        if generator is None:
+            generator = round(steps * math.log2(3 / 2))
+        assert(0 < generator < steps)
+        self.generator = generator
+        self.full = (1 << steps) - 1
+        self.__sharpen = LRUCache(cache_size)
+        self.__flatten = LRUCache(cache_size)
+        self.__sharpen_orbits = LRUCache(cache_size)
+        self.__flatten_orbits = LRUCache(cache_size)
+
+
+    def __repr__(self):
+        return "<{}-EDO>".format(self.steps)
+
+
+    def intervals_to_mask(self, intervals):
+        """
+        Returns the bitmask for a list of intervals.  The intervals may be a sequence
+        of integers, a string of single digits (with "W" and "H" accepted as 2 and 1),
+        or a string of numbers separated by commas or spaces.  They must span exactly
+        one octave.
+        """
+        intervals = self.parse_intervals(intervals)
+        mask = 1
+        key = 0
+        for interval in intervals[:-1]:
+            key += interval
+            mask |= 1 << key
+        return mask
+
+
+    def parse_intervals(self, intervals):
+        """
+        Returns a tuple of integers for any of the interval formats accepted by
+        "intervals_to_mask".
+        """
+        if type(intervals) is str:
+            if INTERVAL_LIST_PATTERN.search(intervals) and ("," in intervals or " " in intervals.strip()):
+                intervals = re.split(r"\s*[, ]\s*", intervals.strip())
+            else:
+                assert(INTERVAL_PATTERN.search(intervals))
+                intervals = intervals.lower().replace("w", "2").replace("h", "1")
+        intervals = tuple(map(int, intervals))
+        assert(min(intervals) > 0)
+        assert(sum(intervals) == self.steps)
+        return intervals
+
+
+    def mask_to_intervals(self, mask):
+        """
+        Returns the tuple of intervals for a scale bitmask.
+        """
+        assert(mask & 1)
+        acc = []
+        last = 0
+        for key in range(1, self.steps + 1):
+            if key == self.steps or mask >> key & 1:
+                acc.append(key - last)
+                last = key
+        return tuple(acc)
+
+
+    def format_intervals(self, intervals):
+        """
+        Returns a string for a tuple of intervals.  Single digit intervals are run
+        together like "2212221", and anything larger is separated by commas.
+        """
+        if max(intervals) <= 9:
+            return "".join(map(str, intervals))
+        return ",".join(map(str, intervals))
+
+
+    def keys(self, mask):
+        """
+        Returns the list of keys in a bitmask.
+        """
+        return [key for key in range(self.steps) if mask >> key & 1]
+
+
+    def rotate(self, mask, key):
+        """
+        Rotates a bitmask such that the given key becomes the first key.
+        """
+        key %= self.steps
+        return (mask >> key | mask << (self.steps - key)) & self.full
+
+
+    def degree_masks(self, mask):
+        """
+        Returns a list of bitmasks for each degree of a scale, rotated to be rooted on
+        that degree.
+        """
+        return [self.rotate(mask, key) for key in self.keys(mask)]
+
+
+    def mode_class(self, mask):
+        """
+        Returns the least of the bitmasks of a scale's modes.
+        """
+        return min(self.degree_masks(mask))
+
+
+    def interval_vector(self, mask):
+        """
+        Returns the interval class vector of a set of keys, as a tuple of counts of the
+        pairs of notes that are 1 through steps // 2 keys apart.
+        """
+        vector = [(mask & self.rotate(mask, step)).bit_count() for step in range(1, self.steps // 2 + 1)]
+        if self.steps % 2 == 0:
+            vector[-1] //= 2
+        return tuple(vector)
+
+
+    def sharpen_step(self, mask):
+        """
+        Returns the bitmask and change in tonic for a scale after one turn clockwise
+        around the circle of the generator, or None if there is no note at or above
+        the generator's inversion.
+        """
+        return self.__sharpen.lookup(mask, self.__sharpen_step)
+
+
+    def __sharpen_step(self, mask):
+        fourth = self.steps - self.generator
+        check = mask >> fourth
+        if check & ((1 << self.generator) - 1):
+            nudge = (check & -check).bit_length() - 1
+            return self.rotate(mask, fourth + nudge), nudge
+        return None
+
+
+    def flatten_step(self, mask):
+        """
+        Returns the bitmask and change in tonic for a scale after one turn widdershins
+        around the circle of the generator.
+        """
+        return self.__flatten.lookup(mask, self.__flatten_step)
+
+
+    def __flatten_step(self, mask):
+        check = mask & ((2 << self.generator) - 1)
+        nudge = self.generator + 1 - check.bit_length()
+        return self.rotate(mask, self.generator - nudge), -nudge
+
+
+    def orbit(self, mask, clockwise=True):
+        """
+        Walks a scale bitmask around the circle of the generator until it repeats or
+        can go no further, and memoizes the walk.  Returns a tuple of the bitmasks
+        visited, the tonic offset at each, the index the walk loops back to (or
+        None), and the tonic offset after the last step.  See "rotation_orbit" in
+        transforms.py.
+        """
+        orbits = self.__sharpen_orbits if clockwise else self.__flatten_orbits
+        step = self.sharpen_step if clockwise else self.flatten_step
+        found = orbits.get(mask)
+        if found is not None:
+            return found
+        start = mask
+        seen = {}
+        masks = []
+        offsets = []
+        offset = 0
+        while mask not in seen:
+            seen[mask] = len(masks)
+            masks.append(mask)
+            offsets.append(offset)
+            found = step(mask)
+            if found is None:
+                break
+            mask, nudge = found
+            offset += nudge
+        loop = seen[mask] if found is not None else None
+        orbit = orbits[start] = (tuple(masks), tuple(offsets), loop, offset)
+        return orbit
+
+
+    def rotate_generator(self, mask, turns):
+        """
+        Returns the bitmask and change in tonic for a scale after some number of turns
+        around the circle of the generator.  Positive number of turns = clockwise.
+        This costs the same for any number of turns once the orbit is memoized.  See
+        "orbit".
+        """
+        if turns == 0:
+            return mask, 0
+        masks, offsets, loop, total = self.orbit(mask, turns > 0)
+        turns = abs(turns)
+        if turns < len(masks):
+            return masks[turns], offsets[turns]
+        if loop is None:
+            raise ValueError("Scale cannot be rotated past a scale with no note above the generator's inversion!")
+        cycles, rest = divmod(turns - loop, len(masks) - loop)
+        return masks[loop + rest], offsets[loop + rest] + cycles * (total - offsets[loop])
+
+
+    def count_scales(self, count=None):
+        """
+        Returns the number of scales that include the tonic, optionally with exactly
+        "count" notes.
+        """
+        if count is None:
+            return 1 << (self.steps - 1)
+        return math.comb(self.steps - 1, count - 1)
+
+
+    def scales(self, count=None):
+        """
+        Yields the bitmask of every scale that includes the tonic, optionally with
+        exactly "count" notes, in increasing order.  This streams the scales rather
+        than building them all.
+        """
+        if count is None:
+            yield from range(1, self.full + 1, 2)
+            return
+        assert(0 < count <= self.steps)
+        rest = count - 1
+        combo = (1 << rest) - 1
+        limit = 1 << (self.steps - 1)
+        while combo < limit:
+            yield combo << 1 | 1
+            if not combo:
+                return
+            low = combo & -combo
+            ripple = combo + low
+            combo = ripple | ((combo ^ ripple) >> 2) // low
+
+
+    def mode_classes(self, count):
+        """
+        Yields the mode class of each set of scales with exactly "count" notes that
+        are modes of each other, as returned by "mode_class".  These are generated
+        directly as necklaces of intervals, pruning any prefix that cannot sum to an
+        octave, so the other modes are never visited.
+        """
+        assert(0 < count <= self.steps)
+        steps = self.steps
+        largest = steps - count + 1
+        intervals = [0] * (count + 1)
+
+        def necklaces(t, p, total):
+            if t > count:
+                if count % p == 0 and total == steps:
+                    yield self.mode_class(self.intervals_to_mask(intervals[1:]))
+                return
+            remaining = count - t
+            start = intervals[t - p] if t > 1 else 1
+            for value in range(start, largest + 1):
+                if total + value + remaining > steps:
+                    break
+                if total + value + remaining * largest < steps:
+                    continue
+                intervals[t] = value
+                yield from necklaces(t + 1, p if value == intervals[t - p] and t > 1 else t, total + value)
+
+        yield from necklaces(1, 1, 0)
+
+
+def test_edo():
+    twelve = EDO(12)
+    assert(twelve.generator == 7)
+    assert([EDO(steps).generator for steps in (19, 24, 31, 53)] == [11, 14, 18, 31])
+    for mask in range(1, OCTAVE_MASK + 1, 2):
+        check = mask >> 5
+        if check:
+            nudge = (check & -check).bit_length() - 1
+            assert(twelve.sharpen_step(mask) == (rotate_mask(mask, 5 + nudge), nudge))
+        else:
+            assert(twelve.sharpen_step(mask) is None)
+        nudge = 8 - (mask & 0xFF).bit_length()
+        assert(twelve.flatten_step(mask) == (rotate_mask(mask, 7 - nudge), -nudge))
+    ionian = twelve.intervals_to_mask("WWHWWWH")
+    assert(ionian == Scale("Ionian").mask)
+    assert(twelve.rotate_generator(Scale("Locrian").mask, 7 * 1000) == (Scale("Locrian").mask, 1000))
+    small = EDO(19, cache_size=4)
+    nineteen = EDO(19)
+    for mask in range(1, 1 << 10, 2):
+        for turns in (-25, -1, 1, 25):
+            try:
+                expected = nineteen.rotate_generator(mask, turns)
+            except ValueError:
+                expected = None
+            try:
+                assert(small.rotate_generator(mask, turns) == expected)
+            except ValueError:
+                assert(expected is None)
+    masks, offsets, loop, total = nineteen.orbit(nineteen.intervals_to_mask("3323332"), False)
+    assert(nineteen.orbit(masks[0], False)[0] is masks and loop is not None)
+    assert(sum(1 for mask in twelve.scales(7)) == twelve.count_scales(7) == 462)
+    assert(sum(1 for mask in twelve.mode_classes(7)) == 66)
+    assert(sum(1 for count in range(1, 13) for mask in twelve.mode_classes(count)) == 351)
+    assert(sorted(twelve.mode_classes(7)) == sorted({twelve.mode_class(mask) for mask in twelve.scales(7)}))
+    assert(twelve.mode_class(ionian) in twelve.mode_classes(7))
+    nineteen = EDO(19)
+    mask = nineteen.intervals_to_mask("3,3,2,3,3,3,2")
+    assert(nineteen.format_intervals(nineteen.mask_to_intervals(mask)) == "3323332")
+    fifty_three = EDO(53)
+    assert(fifty_three.mask_to_intervals(fifty_three.intervals_to_mask("9 9 4 9 9 9 4")) == (9, 9, 4, 9, 9, 9, 4))
+    assert(fifty_three.format_intervals((9, 9, 4, 9, 9, 9, 4)) == "9949994")
+    assert(EDO(31).format_intervals((5, 5, 3, 5, 5, 5, 3)) == "5535553")
+    assert(EDO(24).format_intervals((4, 4, 2, 4, 4, 4, 2)) == "4424442")
+    assert(EDO(53).format_intervals((10, 8, 4, 9, 9, 9, 4)) == "10,8,4,9,9,9,4")
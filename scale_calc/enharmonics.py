@@ -0,0 +1,119 @@
+#!/usr/bin/python3
+
+from itertools import product
+from .scales import *
+
+
+# The seven letter names, in the order they appear in NOTE_NAMES.
+LETTERS = "CDEFGAB"
+
+
+# The position of each letter name on the line of fifths, relative to C.  Each
+# sharp moves a name seven places up the line, and each flat seven places down.
+FIFTHS = {"F": -1, "C": 0, "G": 1, "D": 2, "A": 3, "E": 4, "B": 5}
+
+
+def populate_enharmonic_names():
+    goofy = {}
+    for name, note in GOOFY_NAMES.items():
+        goofy.setdefault(note, []).append(name)
+    names = []
+    for note in NOTE_NAMES:
+        options = [note]
+        if note in ALTERNATES:
+            options.append(ALTERNATES[note])
+        options.extend(goofy.get(note, ()))
+        names.append(tuple(
+            (name,
+             1 << LETTERS.index(name[0]),
+             FIFTHS[name[0]] + 7 * (name.count("#") - name.count("b")),
+             len(name) - 1 + 100 * (name in GOOFY_NAMES))
+            for name in options))
+    return tuple(names)
+
+
+# Every way each pitch class can be spelled, most preferred first, as tuples of
+# (name, letter bit, line of fifths position, cost).  A name costs 1 per accidental
+# plus 100 if it is one of the GOOFY_NAMES.
+ENHARMONIC_NAMES = populate_enharmonic_names()
+del populate_enharmonic_names
+
+
+# Optimal spellings keyed by a bitmask of absolute pitch classes (bit 0 = C).
+# Each is a tuple of twelve names indexed by pitch class, with None for the pitch
+# classes that are not in the set.  See "spell_pitch_classes" below.
+PITCH_CLASS_SPELLINGS = {}
+
+
+# Optimal spellings keyed by (scale bitmask, tonic), listed from the tonic up.
+# See "spell_scale" below.
+SCALE_SPELLINGS = {}
+
+
+def spell_pitch_classes(pitches):
+    """
+    Returns the optimal spelling of a set of pitch classes, given as a bitmask
+    where bit 0 is C.  This searches every enharmonic choice, including the goofy
+    names, for the spelling that uses the most distinct letter names.  Ties go to
+    the spelling with the fewest goofy names, then the one spanning the shortest
+    stretch of the line of fifths, then the fewest accidentals, then the one that
+    prefers sharps starting from C.  The line of fifths keeps thirds and fifths
+    spelled as such, so C Eb F rather than C D# F.
+    """
+    try:
+        return PITCH_CLASS_SPELLINGS[pitches]
+    except KeyError:
+        pass
+    notes = [note for note in range(12) if pitches >> note & 1]
+    best = None
+    best_score = None
+    for choice in product(*(ENHARMONIC_NAMES[note] for note in notes)):
+        names, letters, fifths, costs = zip(*choice)
+        letters = sum(set(letters))
+        goofy, accidentals = divmod(sum(costs), 100)
+        low = min(fifths)
+        high = max(fifths)
+        score = letters.bit_count() * 1000000 - goofy * 10000 - (high - low) * 100 - accidentals
+        if best_score is None or score > best_score:
+            best = choice
+            best_score = score
+    spelled = [None] * 12
+    for note, (name, letter, fifth, penalty) in zip(notes, best):
+        spelled[note] = name
+    spelled = PITCH_CLASS_SPELLINGS[pitches] = tuple(spelled)
+    return spelled
+
+
+def spell_scale(mask, tonic):
+    """
+    Returns the optimal spelling of a scale as a tuple of note names, starting
+    from the tonic.  See "spell_pitch_classes" for how the spelling is chosen.
+    """
+    try:
+        return SCALE_SPELLINGS[(mask, tonic)]
+    except KeyError:
+        pass
+    spelled = spell_pitch_classes(rotate_mask(mask, -tonic))
+    notes = SCALE_SPELLINGS[(mask, tonic)] = tuple(
+        spelled[(key + tonic) % 12] for key in range(12) if mask >> key & 1)
+    return notes
+
+
+def precompute_spellings():
+    """
+    Fills in the spelling tables for every scale that includes the tonic, at
+    every tonic.
+    """
+    for mask in range(1, OCTAVE_MASK + 1, 2):
+        for tonic in range(12):
+            spell_scale(mask, tonic)
+
+
+def test_enharmonics():
+    assert(spell_scale(Scale("Ionian").mask, note_num("D")) == ("D", "E", "F#", "G", "A", "B", "C#"))
+    assert(spell_scale(Scale("Ionian").mask, note_num("Db")) == ("Db", "Eb", "F", "Gb", "Ab", "Bb", "C"))
+    assert(spell_scale(Scale("Harmonic Minor").mask, note_num("G")) == ("G", "A", "Bb", "C", "D", "Eb", "F#"))
+    assert(spell_scale(Scale("Ionian").mask, note_num("F#")) == ("F#", "G#", "A#", "B", "C#", "D#", "E#"))
+    assert(spell_pitch_classes(0b10010001000)[3] == "Eb")
+    assert(spell_scale(0b101001, note_num("C")) == ("C", "Eb", "F"))
+    assert(spell_scale(0b10001, note_num("C#")) == ("Db", "F"))
@@ -0,0 +1,198 @@
+#!/usr/bin/python3
+
+from .analysis import *
+
+
+# How many entries each of the interning tables below holds.
+INTERN_CACHE_SIZE = 4096
+
+
+# Shared Scale and Chord instances, keyed by (bitmask, tonic, name) and (bitmask,
+# root, name).  See "interned_scale" and "interned_chord" below.
+INTERNED_SCALES = LRUCache(INTERN_CACHE_SIZE)
+INTERNED_CHORDS = LRUCache(INTERN_CACHE_SIZE)
+
+
+# Bitmasks and names for the patterns and params passed to "interned_scale" and
+# "interned_chord", so each is only parsed once.
+SCALE_PATTERNS = LRUCache(INTERN_CACHE_SIZE)
+CHORD_PARAMS = LRUCache(INTERN_CACHE_SIZE)
+
+
+# How many entries DERIVED_CACHE holds.  An entry is one bitmask's worth of one
+# kind of derived data.
+DERIVED_CACHE_SIZE = 4096
+
+
+# Tonic-independent data derived from scale bitmasks, shared by every tonic.  See
+# "derived_analysis" and "derived_keyboards" below.
+DERIVED_CACHE = LRUCache(DERIVED_CACHE_SIZE)
+
+
+# The (COMMON_SCALES, COMMON_CHORDS) versions that SCALE_PATTERNS, CHORD_PARAMS and
+# DERIVED_CACHE were filled in from.  See "check_versions" below.
+CACHE_VERSIONS = []
+
+
+def check_versions():
+    """
+    Empties the caches that depend on COMMON_SCALES and COMMON_CHORDS if either of
+    them has been changed since the caches were filled in.  See "LazyDict.version".
+    """
+    versions = (COMMON_SCALES.version, COMMON_CHORDS.version)
+    if not CACHE_VERSIONS or CACHE_VERSIONS[0] != versions:
+        SCALE_PATTERNS.clear()
+        CHORD_PARAMS.clear()
+        DERIVED_CACHE.clear()
+        CACHE_VERSIONS[:] = [versions]
+
+
+def parse_scale_pattern(pattern):
+    scale = Scale(pattern)
+    return scale.mask, scale.name
+
+
+def mask_chord(mask, name, root):
+    keyboard = tuple(mask >> bit & 1 for bit in range(mask.bit_length()))
+    return Chord(keyboard, name=name, root=root)
+
+
+def interned_scale(pattern, tonic=None, name=None):
+    """
+    Returns the shared Scale for the given pattern, tonic, and name.  This accepts
+    the same patterns as Scale, and returns the same frozen instance for the same
+    bitmask, tonic, and name for as long as it stays in INTERNED_SCALES.
+    """
+    check_versions()
+    if type(pattern) is Scale:
+        mask = pattern.mask
+        tonic = pattern.tonic if tonic is None else tonic
+        name = name or pattern.name
+    elif type(pattern) is int:
+        mask = pattern
+    else:
+        mask, found = SCALE_PATTERNS.lookup(pattern, parse_scale_pattern)
+        name = name or found
+    if tonic is not None:
+        tonic = note_num(tonic)
+    return INTERNED_SCALES.lookup((mask, tonic, name), lambda key: Scale(mask, tonic=tonic, name=name).freeze())
+
+
+def interned_chord(*params, name=None, root=None):
+    """
+    Returns the shared Chord for the given params, name, and root.  This accepts the
+    same params as Chord, and returns the same instance for the same bitmask, root,
+    and name for as long as it stays in INTERNED_CHORDS.
+    """
+    check_versions()
+    mask = CHORD_PARAMS.lookup(params, lambda params: Chord(*params).mask)
+    return INTERNED_CHORDS.lookup((mask, root, name), lambda key: mask_chord(*key))
+
+
+def derived_analysis(mask):
+    """
+    Returns the tonic-independent part of a scale's analysis from DERIVED_CACHE.  See
+    "analyze_mask".
+    """
+    check_versions()
+    return DERIVED_CACHE.lookup(mask, analyze_mask)
+
+
+def derived_keyboards(mask):
+    """
+    Returns a tuple of the keyboard of each degree of a scale bitmask from
+    DERIVED_CACHE.  See "Scale.degree_keyboards".
+    """
+    check_versions()
+    return DERIVED_CACHE.lookup(("keyboards", mask), lambda key: tuple(
+        mask_to_keyboard(mode)[:-1] for mode in scale_info(mask).modes))
+
+
+def cached_analyze(scale):
+    """
+    Analyzes a scale like "analyze", sharing the tonic-independent work w/ every
+    other scale analyzed through DERIVED_CACHE.
+    """
+    check_versions()
+    return analyze(scale, DERIVED_CACHE)
+
+
+def cache_stats():
+    """
+    Returns a dict of the number of interned scales and chords, and the stats of
+    DERIVED_CACHE.  See "LRUCache.stats".
+    """
+    stats = DERIVED_CACHE.stats()
+    stats["scales"] = len(INTERNED_SCALES)
+    stats["chords"] = len(INTERNED_CHORDS)
+    return stats
+
+
+def clear_caches():
+    """
+    Drops every interned scale and chord, and empties DERIVED_CACHE.
+    """
+    INTERNED_SCALES.clear()
+    INTERNED_CHORDS.clear()
+    SCALE_PATTERNS.clear()
+    CHORD_PARAMS.clear()
+    DERIVED_CACHE.clear()
+
+
+def test_flyweight():
+    clear_caches()
+    dorian = interned_scale("Dorian", tonic="D")
+    assert(interned_scale("Dorian", tonic=2) is dorian)
+    assert(interned_scale(dorian.mask, tonic="D", name="Dorian") is dorian)
+    assert(interned_scale(dorian) is dorian)
+    assert(interned_scale("Dorian") is not dorian)
+    assert(dorian.nice_name == "D Dorian")
+    for field, value in (("name", "Locrian"), ("tonic", "E")):
+        try:
+            setattr(dorian, field, value)
+        except AttributeError:
+            pass
+        else:
+            assert(False)
+    assert(dorian.nice_name == "D Dorian")
+
+    major = interned_chord("Major 5th", root="C")
+    assert(interned_chord("Major 5th", root="C") is major)
+    assert(interned_chord(4, 3, root="C") is major)
+    assert(major.mask == COMMON_CHORDS["Major 5th"].mask)
+    assert(interned_chord("Major 5th", root="G") is not major)
+
+    results = [cached_analyze(Scale("Ionian", tonic=tonic)) for tonic in range(12)]
+    assert([result.as_dict() for result in results] == [analyze(Scale("Ionian", tonic=tonic)).as_dict() for tonic in range(12)])
+    stats = cache_stats()
+    assert(stats["misses"] == 1 and stats["hits"] == 11)
+    assert(derived_keyboards(dorian.mask) == tuple(dorian.degree_keyboards()))
+    assert(derived_keyboards(dorian.mask) is derived_keyboards(dorian.mask))
+
+    cache = LRUCache(2)
+    for key in range(3):
+        cache.lookup(key, str)
+    assert(0 not in cache and cache.get(2) == "2")
+    assert(cache.stats() == {"size": 2, "limit": 2, "hits": 1, "misses": 3, "evictions": 1})
+
+    hirajoshi = Scale("21414", tonic="C")
+    assert(cached_analyze(hirajoshi).name is None)
+    assert(interned_scale("21414").name is None)
+    COMMON_SCALES["Hirajoshi"] = Scale("21414", name="Hirajoshi")
+    try:
+        assert(cached_analyze(hirajoshi).name == "Hirajoshi")
+        assert(interned_scale("Hirajoshi").mask == hirajoshi.mask)
+    finally:
+        del COMMON_SCALES["Hirajoshi"]
+    major = COMMON_CHORDS["Major 5th"]
+    COMMON_CHORDS["Major 5th"] = Chord(4, 4)
+    try:
+        assert(interned_chord("Major 5th").mask == Chord(4, 4).mask)
+        assert("C Major 5th" not in cached_analyze(Scale("Ionian", tonic="C")).chords)
+    finally:
+        COMMON_CHORDS["Major 5th"] = major
+    assert(interned_chord("Major 5th").mask == major.mask)
+    assert("C Major 5th" in cached_analyze(Scale("Ionian", tonic="C")).chords)
+
+    clear_caches()
+    assert(cache_stats() == {"size": 0, "limit": DERIVED_CACHE_SIZE, "hits": 0, "misses": 0, "evictions": 0, "scales": 0, "chords": 0})
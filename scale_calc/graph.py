@@ -0,0 +1,248 @@
+#!/usr/bin/python3
+
+from array import array
+from .transforms import *
+
+
+# Kinds of edges in the scale graph.  These are bits, so a set of kinds can be
+# passed to the queries below to limit which edges they follow.
+EDGE_SHARPEN = 1
+EDGE_FLATTEN = 2
+EDGE_ALTER = 4
+EDGE_CLINK = 8
+EDGE_ALL = EDGE_SHARPEN | EDGE_FLATTEN | EDGE_ALTER | EDGE_CLINK
+
+
+# The distance recorded for scales a search tree never reaches.  See "ScaleGraph.tree".
+UNREACHED = 0xFF
+
+
+# How many search trees a ScaleGraph keeps memoized.  Each takes about 150 KB.
+GRAPH_TREE_LIMIT = 64
+
+
+def clink_mask(mask):
+    """
+    Returns the bitmask of the pentatonic scale "clink_my_heptatonic" builds from a
+    heptatonic scale bitmask, or None if the scale is not heptatonic.
+    """
+    keys = [key for key in range(12) if mask >> key & 1]
+    if len(keys) != 7:
+        return None
+    return mask & ~(1 << keys[2] | 1 << keys[5])
+
+
+def scale_edges(mask):
+    """
+    Returns the edges leaving a scale bitmask as a list of (bitmask, tonic offset,
+    kind) tuples.  The edges are one step around the circle of fifths either way,
+    moving any one note up or down a half step into an empty key, and the clink of
+    a heptatonic scale.  Moving the tonic itself also moves the tonic.
+    """
+    edges = []
+    step = SHARPEN_STEPS[mask]
+    if step is not None:
+        edges.append((step[0], step[1], EDGE_SHARPEN))
+    step = FLATTEN_STEPS[mask]
+    if step is not None:
+        edges.append((step[0], step[1], EDGE_FLATTEN))
+    for key in range(12):
+        if not mask >> key & 1:
+            continue
+        for move in (-1, 1):
+            dest = (key + move) % 12
+            if mask >> dest & 1:
+                continue
+            altered = mask & ~(1 << key) | 1 << dest
+            if key == 0:
+                edges.append((rotate_mask(altered, move), move, EDGE_ALTER))
+            else:
+                edges.append((altered, 0, EDGE_ALTER))
+    clinked = clink_mask(mask)
+    if clinked is not None:
+        edges.append((clinked, 0, EDGE_CLINK))
+    return edges
+
+
+class ScaleGraph:
+    """
+    The neighborhood graph of every scale that includes the tonic.  A node is a
+    scale bitmask at some tonic, but the edges only depend on the bitmask, so they
+    are stored once per bitmask w/ the change in tonic each one makes.
+
+    The edges are packed CSR style: the edges leaving a bitmask are the entries of
+    "targets", "shifts", and "kinds" from offsets[mask] up to offsets[mask + 1].
+    """
+
+    __slots__ = ("offsets", "targets", "shifts", "kinds", "trees")
+
+
+    def __init__(self):
+        self.offsets = array("I", [0])
+        self.targets = array("H")
+        self.shifts = array("b")
+        self.kinds = array("B")
+        self.trees = {}
+        for mask in range(OCTAVE_MASK + 1):
+            if mask & 1:
+                for target, shift, kind in scale_edges(mask):
+                    self.targets.append(target)
+                    self.shifts.append(shift)
+                    self.kinds.append(kind)
+            self.offsets.append(len(self.targets))
+
+
+    @property
+    def size(self):
+        """
+        The number of edges in the graph, counting each bitmask once.
+        """
+        return len(self.targets)
+
+
+    def neighbors(self, mask, kinds=EDGE_ALL):
+        """
+        Returns the edges leaving a scale bitmask as a list of (bitmask, tonic
+        offset, kind) tuples, limited to the given kinds of edges.
+        """
+        start = self.offsets[mask]
+        end = self.offsets[mask + 1]
+        return [
+            (self.targets[edge], self.shifts[edge], self.kinds[edge])
+            for edge in range(start, end) if self.kinds[edge] & kinds]
+
+
+    def tree(self, mask, kinds=EDGE_ALL):
+        """
+        Returns the breadth first search tree of every scale reachable from a scale
+        bitmask w/ its tonic on C, as a tuple of the nodes in order of distance, the
+        distance to each node, and the node each was reached from.  A node is a scale
+        bitmask times twelve plus its tonic.  Unreached nodes have the distance
+        UNREACHED.
+
+        The graph looks the same from every tonic, so the tree from any tonic is
+        this one transposed.  Trees are memoized in "trees", oldest out first once
+        there are GRAPH_TREE_LIMIT of them.
+        """
+        key = (mask, kinds)
+        try:
+            return self.trees[key]
+        except KeyError:
+            pass
+        offsets = self.offsets
+        targets = self.targets
+        shifts = self.shifts
+        edge_kinds = self.kinds
+        distances = array("B", [UNREACHED]) * (12 * (OCTAVE_MASK + 1))
+        parents = array("H", [0]) * (12 * (OCTAVE_MASK + 1))
+        order = array("H", [mask * 12])
+        distances[mask * 12] = 0
+        for node in order:
+            mask, tonic = divmod(node, 12)
+            distance = distances[node] + 1
+            for edge in range(offsets[mask], offsets[mask + 1]):
+                if edge_kinds[edge] & kinds:
+                    child = targets[edge] * 12 + (tonic + shifts[edge]) % 12
+                    if distances[child] == UNREACHED:
+                        distances[child] = distance
+                        parents[child] = node
+                        order.append(child)
+        if len(self.trees) >= GRAPH_TREE_LIMIT:
+            del self.trees[next(iter(self.trees))]
+        tree = self.trees[key] = (order, distances, parents)
+        return tree
+
+
+    def shortest_path(self, start, goal, kinds=EDGE_ALL):
+        """
+        Returns the shortest list of scales leading from the start scale to the goal
+        scale, including both, or None if the goal can't be reached.  Both scales
+        must have the tonic set.
+        """
+        if not start.has_tonic() or not goal.has_tonic():
+            raise ValueError("The scale must have the tonic set to do this.")
+        order, distances, parents = self.tree(start.mask, kinds)
+        node = goal.mask * 12 + (goal.tonic - start.tonic) % 12
+        if distances[node] == UNREACHED:
+            return None
+        path = [node_scale(node, start.tonic)]
+        for step in range(distances[node]):
+            node = parents[node]
+            path.append(node_scale(node, start.tonic))
+        return path[::-1]
+
+
+    def distance(self, start, goal, kinds=EDGE_ALL):
+        """
+        Returns the number of edges between two scales, or None if the goal can't
+        be reached.  Both scales must have the tonic set.
+        """
+        if not start.has_tonic() or not goal.has_tonic():
+            raise ValueError("The scale must have the tonic set to do this.")
+        order, distances, parents = self.tree(start.mask, kinds)
+        distance = distances[goal.mask * 12 + (goal.tonic - start.tonic) % 12]
+        return None if distance == UNREACHED else distance
+
+
+    def nearest(self, scale, count, kinds=EDGE_ALL):
+        """
+        Returns a list of (distance, scale) pairs for the "count" scales closest to
+        the given scale, not counting the scale itself.  The scale must have the
+        tonic set.
+        """
+        if not scale.has_tonic():
+            raise ValueError("The scale must have the tonic set to do this.")
+        order, distances, parents = self.tree(scale.mask, kinds)
+        return [(distances[node], node_scale(node, scale.tonic)) for node in order[1:count + 1]]
+
+
+def node_scale(node, transpose=0):
+    """
+    Returns the Scale for a graph node, transposed by some number of keys, and
+    named after the matching common scale if there is one.
+    """
+    mask, tonic = divmod(node, 12)
+    return Scale(mask, tonic=(tonic + transpose) % 12, name=scale_info(mask).name)
+
+
+SCALE_GRAPH = []
+
+
+def scale_graph():
+    """
+    Returns the ScaleGraph, building it on first use.
+    """
+    if not SCALE_GRAPH:
+        SCALE_GRAPH.append(ScaleGraph())
+    return SCALE_GRAPH[0]
+
+
+def test_graph():
+    graph = scale_graph()
+    c_major = Scale("Ionian", tonic="C")
+    g_major = Scale("Ionian", tonic="G")
+
+    sharper = rotate(c_major, 1)
+    assert((sharper.mask, sharper.tonic - c_major.tonic, EDGE_SHARPEN) in graph.neighbors(c_major.mask))
+    assert(graph.neighbors(c_major.mask, EDGE_CLINK) == [(clink_my_heptatonic(Scale("Ionian")).mask, 0, EDGE_CLINK)])
+
+    assert(graph.distance(c_major, c_major) == 0)
+    assert(graph.distance(c_major, Scale("Lydian", tonic="C")) == 1)
+    path = graph.shortest_path(c_major, g_major)
+    assert(path[0].nice_name == "C Ionian")
+    assert(path[-1].nice_name == "G Ionian")
+    assert(len(path) - 1 == graph.distance(c_major, g_major))
+    for scale, after in zip(path, path[1:]):
+        edges = graph.neighbors(scale.mask)
+        assert(any(mask == after.mask and (scale.tonic + shift) % 12 == after.tonic for mask, shift, kind in edges))
+    assert(graph.distance(Scale("Ionian", tonic="D"), Scale("Ionian", tonic="A")) == len(path) - 1)
+
+    pentatonic = Scale("23232", tonic="C")
+    assert(graph.shortest_path(pentatonic, c_major) is None)
+    assert(graph.distance(c_major, pentatonic, EDGE_ALTER) is None)
+    assert(graph.distance(c_major, pentatonic) is not None)
+
+    near = graph.nearest(c_major, 10)
+    assert(len(near) == 10)
+    assert([distance for distance, scale in near] == sorted(distance for distance, scale in near))
+    assert(all(graph.distance(c_major, scale) == distance for distance, scale in near))
@@ -0,0 +1,245 @@
+#!/usr/bin/python3
+
+from .analysis import *
+
+
+# The chord tones of each triad quality, as bitmasks rooted on the chord's root.
+TRIAD_SHAPES = {
+    "Augmented": 0b100010001,
+    "Major": 0b10010001,
+    "Minor": 0b10001001,
+    "Diminished": 0b1001001,
+    "Unknown": 0b1,
+}
+
+
+# The seventh chords that can be stacked on each triad quality, most preferred
+# first, as (name, bitmask) pairs.  The names match COMMON_CHORDS.  For the scales
+# that aren't heptatonic, and so can't stack thirds from alternate degrees, the
+# seventh is the first one listed for the degree's triad that fits.
+SEVENTH_SHAPES = {
+    "Augmented": (
+        ("Augmented 7th", 0b10100010001),
+        ("Augmented Major 7th", 0b100100010001)),
+    "Major": (
+        ("Dominant 7th", 0b10010010001),
+        ("Major 7th", 0b100010010001)),
+    "Minor": (
+        ("Minor 7th", 0b10010001001),
+        ("Minor Major 7th", 0b100010001001)),
+    "Diminished": (
+        ("Half-diminished 7th", 0b10001001001),
+        ("Diminished 7th", 0b1001001001),
+        ("Diminished Major 7th", 0b100001001001)),
+    "Unknown": (
+        ("Dominant 7th b5", 0b10001010001),
+        ("Major 7th b5", 0b100001010001)),
+}
+
+
+# Seventh chord names keyed by the bitmask of the stacked chord tones, for
+# "stacked_harmony".
+STACKED_SEVENTHS = {shape: name for sevenths in SEVENTH_SHAPES.values() for name, shape in sevenths}
+
+
+# The tensions that can be stacked above a seventh chord, as (name, key) pairs,
+# most preferred first.  A key that is already a chord tone is never a tension.
+NINTHS = (("9", 2), ("b9", 1), ("#9", 3))
+ELEVENTHS = (("11", 5), ("#11", 6))
+THIRTEENTHS = (("13", 9), ("b13", 8))
+
+
+# Suspended and added tone chords, as (name, bitmask) pairs.  The added tones only
+# apply to major and minor triads.
+SUS_SHAPES = (("sus2", 0b10000101), ("sus4", 0b10100001))
+ADD_SHAPES = (("add9", 0b100), ("add11", 0b100000), ("6", 0b1000000000))
+
+
+class Harmony:
+    """
+    The stacked thirds harmony of one scale degree: its triad quality, the seventh
+    chord, ninth, eleventh, and thirteenth on top of that when the degree has them,
+    and the suspended and added tone chords it can also hold.  These are looked up
+    from the HARMONY table and are meant to be read only.
+
+    The triad is the one "degree_quality" reports, so it always matches
+    "scale_degree_qualities".  For heptatonic scales, the rest of the chord is
+    stacked from alternate notes of the degree's mode too: the 7th note is the
+    seventh, and the 2nd, 4th, and 6th are the 9th, 11th, and 13th.  In smaller and
+    larger scales, the seventh is the first one in SEVENTH_SHAPES for the triad that
+    fits.
+    """
+
+    __slots__ = ("mask", "triad", "seventh", "ninth", "eleventh", "thirteenth", "sus", "adds")
+
+
+    def __init__(self, mask, triad, seventh, ninth, eleventh, thirteenth, sus, adds):
+        self.mask = mask
+        self.triad = triad
+        self.seventh = seventh
+        self.ninth = ninth
+        self.eleventh = eleventh
+        self.thirteenth = thirteenth
+        self.sus = sus
+        self.adds = adds
+
+
+    def __repr__(self):
+        return "<{} Harmony>".format(self.seventh or self.triad)
+
+
+    @property
+    def extensions(self):
+        """
+        The ninth, eleventh, and thirteenth of this harmony that are present, in order.
+        """
+        return tuple(tension for tension in (self.ninth, self.eleventh, self.thirteenth) if tension)
+
+
+    def numeral(self, degree, extended=False):
+        """
+        Returns the roman numeral for this harmony on the given degree number, using
+        the seventh chord when there is one.  If "extended" is set, the ninth,
+        eleventh, and thirteenth are included.  See "degree_numeral".
+        """
+        extensions = self.extensions if extended and self.seventh else ()
+        return degree_numeral(degree, self.triad, self.seventh, extensions)
+
+
+def tension(mask, tones, options):
+    """
+    Returns the name of the first of the options, as (name, key) pairs, whose key is
+    in the bitmask but isn't one of the chord tones, or None.
+    """
+    for name, key in options:
+        if mask >> key & 1 and not tones >> key & 1:
+            return name
+    return None
+
+
+def stacked_harmony(keys):
+    """
+    Returns the triad quality, seventh chord name, ninth, eleventh, and thirteenth
+    stacked from alternate notes of a mode, given as the list of its keys.  The
+    mode must have exactly seven notes.  See "degree_quality".
+    """
+    triad = degree_quality(sum(1 << key for key in keys))
+    seventh = STACKED_SEVENTHS.get(1 | 1 << keys[2] | 1 << keys[4] | 1 << keys[6])
+    if seventh is None:
+        return triad, None, None, None, None
+    return (
+        triad,
+        seventh,
+        tension(1 << keys[1], 0, NINTHS),
+        tension(1 << keys[3], 0, ELEVENTHS),
+        tension(1 << keys[5], 0, THIRTEENTHS))
+
+
+def harmony_of(mask):
+    """
+    Works out the Harmony for a bitmask rooted on a scale degree.  See "degree_harmony"
+    for the memoized version.
+    """
+    keys = [key for key in range(12) if mask >> key & 1]
+    if len(keys) == 7:
+        triad, seventh, ninth, eleventh, thirteenth = stacked_harmony(keys)
+    else:
+        triad = degree_quality(mask)
+        seventh = None
+        tones = TRIAD_SHAPES[triad]
+        for name, shape in SEVENTH_SHAPES[triad]:
+            if mask & shape == shape:
+                seventh = name
+                tones = shape
+                break
+        ninth = eleventh = thirteenth = None
+        if seventh:
+            ninth = tension(mask, tones, NINTHS)
+            eleventh = tension(mask, tones, ELEVENTHS)
+            thirteenth = tension(mask, tones, THIRTEENTHS)
+    sus = tuple(name for name, shape in SUS_SHAPES if mask & shape == shape)
+    adds = ()
+    if triad in ("Major", "Minor"):
+        adds = tuple(name for name, shape in ADD_SHAPES if mask & shape)
+    return Harmony(mask, triad, seventh, ninth, eleventh, thirteenth, sus, adds)
+
+
+def populate_harmony():
+    for mask in range(1, OCTAVE_MASK + 1, 2):
+        HARMONY[mask] = harmony_of(mask)
+
+
+# The Harmony of every bitmask rooted on a scale degree, such as the ones returned
+# by "Scale.degree_masks".  This is populated on first use.  See "populate_harmony"
+# above.
+HARMONY = LazyDict()
+HARMONY.defer(populate_harmony)
+del populate_harmony
+
+
+def degree_harmony(mask):
+    """
+    Returns the Harmony for a bitmask rooted on a scale degree.
+    """
+    return HARMONY[mask & OCTAVE_MASK]
+
+
+def scale_harmonies(scale):
+    """
+    Returns a tuple of the Harmony of each degree of the given scale.
+    """
+    return tuple(HARMONY[mode] for mode in scale_info(scale.mask).modes)
+
+
+def scale_degree_sevenths(scale):
+    """
+    For a given scale, return the name of the seventh chord on each degree, or None
+    for the degrees that have none.
+    """
+    return tuple(harmony.seventh for harmony in scale_harmonies(scale))
+
+
+def seventh_numerals(scale, extended=False):
+    """
+    Returns the roman numerals for the seventh chords on the scale's degrees, using
+    the triad for the degrees that have no seventh chord.  See "Harmony.numeral".
+    """
+    return tuple(harmony.numeral(degree, extended) for degree, harmony in enumerate(scale_harmonies(scale), 1))
+
+
+def test_harmony():
+    assert(seventh_numerals(Scale("Ionian")) == ("IM7", "ii7", "iii7", "IVM7", "V7", "vi7", "vii%7"))
+    assert(seventh_numerals(Scale("Harmonic Minor")) == ("iM7", "ii%7", "III+M7", "iv7", "V7", "VIM7", "vii*7"))
+    assert(seventh_numerals(Scale("Melodic Minor")) == ("iM7", "ii7", "III+M7", "IV7", "V7", "vi%7", "vii%7"))
+    assert(seventh_numerals(Scale("Harmonic Major 1"))[0] == "IM7")
+    assert(seventh_numerals(Scale("Harmonic Minor"), extended=True)[4] == "V7(b9,11,b13)")
+    assert(seventh_numerals(Scale("23232")) == ("1?", "2?", "3?", "iv7", "V"))
+    assert(seventh_numerals(Scale("Mixolydian"), extended=True)[0] == "I7(9,11,13)")
+    assert(seventh_numerals(Scale("Ionian"), extended=True)[4] == "V7(9,11,13)")
+    assert(seventh_numerals(Scale("Phrygian"), extended=True)[0] == "i7(b9,11,b13)")
+    assert(seventh_numerals(Scale("Lydian"), extended=True)[0] == "IM7(9,#11,13)")
+
+    for name in DIATONIC_MODE_NAMES + ("Harmonic Minor", "Melodic Minor", "Cursed 1"):
+        scale = Scale(name)
+        harmonies = scale_harmonies(scale)
+        for harmony, mask in zip(harmonies, scale.degree_masks()):
+            assert(mask & TRIAD_SHAPES[harmony.triad] == TRIAD_SHAPES[harmony.triad])
+            if harmony.seventh in COMMON_CHORDS:
+                chord = fold_mask(COMMON_CHORDS[harmony.seventh].mask)
+                assert(mask & chord == chord)
+
+    harmony = degree_harmony(Scale("Ionian").mask)
+    assert(harmony.sus == ("sus2", "sus4"))
+    assert(harmony.adds == ("add9", "add11", "6"))
+    assert(degree_harmony(Scale("Ionian").degree_masks()[6]).adds == ())
+    assert(degree_harmony(0b10000101).triad == "Unknown")
+    assert(degree_harmony(0b10000101).numeral(2) == "2?")
+
+    for scale in [Scale(pattern) for pattern in ("21212121", "111111111111", "23232")] + list(COMMON_SCALES.values()):
+        assert(tuple(harmony.triad for harmony in scale_harmonies(scale)) == scale_degree_qualities(scale))
+    assert(seventh_numerals(Scale("111111111111"))[0] == "I+7")
+    for mask in range(1, OCTAVE_MASK + 1, 2):
+        harmony = degree_harmony(mask)
+        if harmony.seventh:
+            assert(harmony.seventh in dict(SEVENTH_SHAPES[harmony.triad]))
+    assert(degree_harmony(0b1011011001).triad == "Major" and degree_harmony(0b1011011001).seventh is None)
@@ -0,0 +1,91 @@
+#!/usr/bin/python3
+
+from .chords import *
+from .enharmonics import *
+
+
+class ChordIdentifier:
+    """
+    Identifies chords from the notes that are sounding.  Every chord in the given
+    mapping of names to Chord objects is hashed in every transposition, keyed by the
+    set of pitch classes it covers, so identifying a set of notes is one dict probe.
+    """
+
+    __slots__ = ("__shapes",)
+
+
+    def __init__(self, chords):
+        shapes = {}
+        for order, (name, chord) in enumerate(chords.items()):
+            mask = chord_mask(chord)
+            keys = [key for key in range(mask.bit_length()) if mask >> key & 1]
+            for root in range(12):
+                tones = []
+                for key in keys:
+                    if (root + key) % 12 not in tones:
+                        tones.append((root + key) % 12)
+                pitches = sum(1 << tone for tone in tones)
+                shapes.setdefault(pitches, []).append((order, root, name, tuple(tones)))
+        self.__shapes = shapes
+
+
+    def identify(self, notes):
+        """
+        Returns a list of (root, chord name, inversion) candidates for a voicing, in
+        order of preference.  The notes may be note names or note numbers.  The bass
+        is the lowest note number, or the first note if any are given by name.  The
+        inversion is 0 when the root is in the bass, 1 for the third, and so on.
+
+        Root position candidates are listed first, then by inversion, then by the
+        order of the chords in the catalog.
+        """
+        notes = list(notes)
+        if not notes:
+            return []
+        if all(type(note) == int for note in notes):
+            bass = min(notes) % 12
+        else:
+            bass = note_num(notes[0])
+        pitches = 0
+        for note in notes:
+            pitches |= 1 << note_num(note)
+        found = self.__shapes.get(pitches)
+        if not found:
+            return []
+        spelled = spell_pitch_classes(pitches)
+        ranked = sorted((tones.index(bass), order, spelled[root], name)
+            for order, root, name, tones in found)
+        return [(root, name, inversion) for inversion, order, root, name in ranked]
+
+
+# The ChordIdentifier for COMMON_CHORDS.  See "identify_chord" below.
+COMMON_CHORD_IDENTIFIER = []
+
+
+def identify_chord(notes):
+    """
+    Returns a list of (root, chord name, inversion) candidates from COMMON_CHORDS for
+    the given notes.  See "ChordIdentifier.identify".
+    """
+    if not COMMON_CHORD_IDENTIFIER or COMMON_CHORD_IDENTIFIER[0][0] != COMMON_CHORDS.version:
+        COMMON_CHORD_IDENTIFIER[:] = [(COMMON_CHORDS.version, ChordIdentifier(COMMON_CHORDS))]
+    return COMMON_CHORD_IDENTIFIER[0][1].identify(notes)
+
+
+def test_identify():
+    assert(identify_chord(["C", "E", "G"])[0] == ("C", "Major 5th", 0))
+    assert(identify_chord([64, 67, 72])[0] == ("C", "Major 5th", 1))
+    assert(identify_chord(["Bb", "Eb", "G"])[0] == ("Eb", "Major 5th", 2))
+    assert(identify_chord(["B", "D", "F", "A"])[0] == ("B", "Half-diminished 7th", 0))
+    assert(len(identify_chord(["C", "Eb", "Gb", "A"])) == 4)
+    assert(identify_chord(["C", "Db", "D"]) == [])
+
+    major = COMMON_CHORDS["Major 5th"]
+    COMMON_CHORDS["Major 5th"] = Chord(4, 4)
+    try:
+        assert(("C", "Major 5th", 0) not in identify_chord(["C", "E", "G"]))
+        assert(("C", "Major 5th", 0) in identify_chord(["C", "E", "G#"]))
+        assert("Major 5th" not in dict(common_chord_index().matches(Scale("Ionian").mask)))
+    finally:
+        COMMON_CHORDS["Major 5th"] = major
+    assert(identify_chord(["C", "E", "G"])[0] == ("C", "Major 5th", 0))
@@ -0,0 +1,209 @@
+#!/usr/bin/python3
+
+import sys
+import time
+from contextlib import contextmanager
+from functools import wraps
+from importlib import import_module
+
+
+# The functions that are counted and timed while instrumentation is enabled, given
+# as "module.name" or "module.Class.method" relative to the scale_calc package.
+INSTRUMENTED = (
+    "scales.normalize_intervals",
+    "notes.note_num",
+    "scales.Scale.__init__",
+    "chords.compare_chords",
+    "analysis.spelling",
+    "analysis.find_chords",
+    "transforms.sharpen",
+    "transforms.flatten",
+)
+
+
+# The memoized lookups that have their hit rates recorded while instrumentation is
+# enabled.  Each maps to a probe which takes the lookup's arguments, and returns
+# True if the result is already cached.
+CACHES = {
+    "universe.scale_info": lambda mask: mask in import_module(__package__ + ".scales").UNIVERSE,
+    "chords.ChordIndex.matches": lambda index, mask: mask in index._ChordIndex__matches,
+    "transforms.rotation_orbit": lambda steps, orbits, mask: mask in orbits,
+    "enharmonics.spell_scale": lambda mask, tonic: (mask, tonic) in import_module(__package__ + ".enharmonics").SCALE_SPELLINGS,
+}
+
+
+# Call counts and cumulative seconds per function, and hit and miss counts per
+# cache, recorded while instrumentation is enabled.  See "snapshot" below.
+CALLS = {}
+SECONDS = {}
+HITS = {}
+MISSES = {}
+
+
+# The original functions that have been replaced, keyed by their "INSTRUMENTED"
+# or "CACHES" names.  This is empty while instrumentation is disabled.
+ORIGINALS = {}
+
+
+def resolve(target):
+    """
+    Returns the owner object and attribute name for an "INSTRUMENTED" or "CACHES"
+    name.
+    """
+    module, *path = target.split(".")
+    owner = import_module("{}.{}".format(__package__, module))
+    for name in path[:-1]:
+        owner = getattr(owner, name)
+    return owner, path[-1]
+
+
+def replace(original, replacement):
+    """
+    Replaces a function everywhere it has been star-imported within the package.
+    """
+    for name, module in list(sys.modules.items()):
+        if not name.startswith(__package__ + "."):
+            continue
+        for attr, value in list(vars(module).items()):
+            if value is original:
+                setattr(module, attr, replacement)
+
+
+def timed(target, original):
+    @wraps(original)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            SECONDS[target] += time.perf_counter() - start
+            CALLS[target] += 1
+    return wrapper
+
+
+def probed(target, original, probe):
+    @wraps(original)
+    def wrapper(*args):
+        if probe(*args):
+            HITS[target] += 1
+        else:
+            MISSES[target] += 1
+        return original(*args)
+    return wrapper
+
+
+def install(target, replacement):
+    owner, attr = resolve(target)
+    original = getattr(owner, attr)
+    ORIGINALS[target] = original
+    if type(owner) is type:
+        setattr(owner, attr, replacement(original))
+    else:
+        replace(original, replacement(original))
+
+
+def enable():
+    """
+    Starts counting calls, time and cache hits for the package's hot paths.  The
+    functions are swapped for wrappers, so there is no overhead while disabled.
+    """
+    if ORIGINALS:
+        return
+    for target in INSTRUMENTED:
+        CALLS.setdefault(target, 0)
+        SECONDS.setdefault(target, 0.0)
+        install(target, lambda original, target=target: timed(target, original))
+    for target, probe in CACHES.items():
+        HITS.setdefault(target, 0)
+        MISSES.setdefault(target, 0)
+        install(target, lambda original, target=target, probe=probe: probed(target, original, probe))
+
+
+def disable():
+    """
+    Puts the original functions back.  The recorded numbers are kept until "reset"
+    is called.
+    """
+    for target, original in reversed(list(ORIGINALS.items())):
+        owner, attr = resolve(target)
+        if type(owner) is type:
+            setattr(owner, attr, original)
+        else:
+            replace(getattr(owner, attr), original)
+    ORIGINALS.clear()
+
+
+def reset():
+    """
+    Zeroes all of the recorded numbers.
+    """
+    for table in (CALLS, HITS, MISSES):
+        for key in table:
+            table[key] = 0
+    for key in SECONDS:
+        SECONDS[key] = 0.0
+
+
+@contextmanager
+def instrumented():
+    """
+    Context manager that enables instrumentation for the duration of a block.
+    """
+    enabled = bool(ORIGINALS)
+    enable()
+    try:
+        yield
+    finally:
+        if not enabled:
+            disable()
+
+
+def snapshot():
+    """
+    Returns a dict of the recorded numbers.  Functions have "calls" and "seconds",
+    and caches have "hits", "misses" and "hit_rate".
+    """
+    stats = {}
+    for target in CALLS:
+        stats[target] = {"calls": CALLS[target], "seconds": SECONDS[target]}
+    for target in HITS:
+        total = HITS[target] + MISSES[target]
+        stats[target] = {
+            "hits": HITS[target],
+            "misses": MISSES[target],
+            "hit_rate": HITS[target] / total if total else 0.0,
+        }
+    return stats
+
+
+def prometheus():
+    """
+    Returns the recorded numbers in the Prometheus text exposition format.
+    """
+    lines = []
+    def metric(name, kind, help, label, table):
+        lines.append("# HELP scale_calc_{} {}".format(name, help))
+        lines.append("# TYPE scale_calc_{} {}".format(name, kind))
+        for target, value in table.items():
+            lines.append('scale_calc_{}{{{}="{}"}} {}'.format(name, label, target, value))
+    metric("calls_total", "counter", "Calls to instrumented functions.", "function", CALLS)
+    metric("seconds_total", "counter", "Cumulative seconds spent in instrumented functions.", "function", SECONDS)
+    metric("cache_hits_total", "counter", "Memoized lookups that were already cached.", "cache", HITS)
+    metric("cache_misses_total", "counter", "Memoized lookups that had to be computed.", "cache", MISSES)
+    return "\n".join(lines) + "\n"
+
+
+def test_instrument():
+    analysis = import_module(__package__ + ".analysis")
+    original = analysis.spelling
+    reset()
+    with instrumented():
+        analysis.find_chords(analysis.Scale("Dorian", tonic="E"))
+        analysis.rotate(analysis.Scale("Ionian", tonic="C"), 3)
+    assert(analysis.spelling is original)
+    stats = snapshot()
+    assert(stats["analysis.find_chords"]["calls"] == 1)
+    assert(stats["analysis.spelling"]["calls"] == 1)
+    assert(stats["transforms.sharpen"]["calls"] == 1)
+    assert(stats["chords.ChordIndex.matches"]["hits"] + stats["chords.ChordIndex.matches"]["misses"] == 7)
+    assert('scale_calc_calls_total{function="analysis.find_chords"} 1' in prometheus())
@@ -0,0 +1,267 @@
+#!/usr/bin/python3
+
+from multiprocessing import Pool
+from .transforms import *
+
+
+# Memoized circle of fifths distances, keyed by scale bitmask.  See
+# "fifths_distances" below.
+FIFTHS_DISTANCES = {}
+
+
+def fifths_distances(mask):
+    """
+    Returns a dict of the fewest turns around the circle of fifths, either way, that
+    take a scale bitmask w/ its tonic on C to each set of pitch classes it can reach.
+    The sets of pitch classes are bitmasks where bit 0 is C.  Each turn raises or
+    lowers one note, same as "rotate".
+    """
+    try:
+        return FIFTHS_DISTANCES[mask]
+    except KeyError:
+        pass
+    distances = {}
+    for steps in (SHARPEN_STEPS, FLATTEN_STEPS):
+        current = mask
+        tonic = 0
+        seen = set()
+        turns = 0
+        while (current, tonic) not in seen:
+            seen.add((current, tonic))
+            pitches = rotate_mask(current, -tonic)
+            if distances.get(pitches, turns) >= turns:
+                distances[pitches] = turns
+            step = steps[current]
+            if step is None:
+                break
+            current, nudge = step
+            tonic = (tonic + nudge) % 12
+            turns += 1
+    FIFTHS_DISTANCES[mask] = distances
+    return distances
+
+
+def chord_pitches(chord):
+    """
+    Returns the set of pitch classes a chord covers, as a bitmask where bit 0 is C.
+    The chord must have its root set.
+    """
+    if chord.root is None:
+        raise ValueError("The chord must have the root set to do this.")
+    return rotate_mask(fold_mask(chord.mask), -note_num(chord.root))
+
+
+class KeyFitter:
+    """
+    Fits chord progressions to keys.  The keys are the given scales at every tonic,
+    which default to the distinct scales in COMMON_SCALES.
+
+    Each chord is placed in the keys whose notes include all of the chord's notes,
+    or if there are none, the keys missing the fewest of them at "miss_penalty"
+    each.  Moving between keys costs "modulation_penalty" for each turn around the
+    circle of fifths between their notes, plus "tonic_penalty" if the tonic moves.
+    Keys that can't be reached from each other by turning cost "far_penalty".  The
+    cheapest path of keys is then found by dynamic programming.
+    """
+
+    __slots__ = ("keys", "modulation_penalty", "tonic_penalty", "far_penalty", "miss_penalty", "__fits", "__costs")
+
+
+    def __init__(self, scales=None, modulation_penalty=1, tonic_penalty=1, far_penalty=8, miss_penalty=4):
+        if scales is None:
+            scales = COMMON_SCALES.values()
+        masks = []
+        for scale in scales:
+            mask = scale.mask if type(scale) is Scale else scale
+            if mask not in masks:
+                masks.append(mask)
+        self.keys = tuple((mask, tonic) for mask in masks for tonic in range(12))
+        self.modulation_penalty = modulation_penalty
+        self.tonic_penalty = tonic_penalty
+        self.far_penalty = far_penalty
+        self.miss_penalty = miss_penalty
+        self.__fits = {}
+        self.__costs = {}
+
+
+    def fits(self, pitches):
+        """
+        Returns a pair of the cost and the tuple of key indices a set of pitch classes
+        is placed in.  See the class description.
+        """
+        try:
+            return self.__fits[pitches]
+        except KeyError:
+            pass
+        missing = [
+            (pitches & ~rotate_mask(mask, -tonic)).bit_count()
+            for mask, tonic in self.keys]
+        least = min(missing)
+        fit = self.__fits[pitches] = (
+            least * self.miss_penalty,
+            tuple(index for index, count in enumerate(missing) if count == least))
+        return fit
+
+
+    def cost(self, before, after):
+        """
+        Returns the cost of moving from one key to another, by key index.
+        """
+        try:
+            return self.__costs[(before, after)]
+        except KeyError:
+            pass
+        if before == after:
+            cost = 0
+        else:
+            mask, tonic = self.keys[before]
+            other, other_tonic = self.keys[after]
+            turns = fifths_distances(mask).get(rotate_mask(other, tonic - other_tonic))
+            if turns is None:
+                cost = self.far_penalty
+            else:
+                cost = turns * self.modulation_penalty + (tonic != other_tonic) * self.tonic_penalty
+        self.__costs[(before, after)] = cost
+        return cost
+
+
+    def key_scale(self, index):
+        """
+        Returns the Scale for a key index, named after the matching common scale if
+        there is one.
+        """
+        mask, tonic = self.keys[index]
+        return Scale(mask, tonic=tonic, name=scale_info(mask).name)
+
+
+    def candidates(self, chord):
+        """
+        Returns the list of keys, as Scales, that the given chord is placed in.
+        """
+        return [self.key_scale(index) for index in self.fits(chord_pitches(chord))[1]]
+
+
+    def fit(self, chords):
+        """
+        Returns a pair of the total cost and the list of keys, as Scales, that best
+        fit the given sequence of chords.  Ties go to the keys that come first.
+        """
+        if not chords:
+            return 0, []
+        cost = self.cost
+        miss, states = self.fits(chord_pitches(chords[0]))
+        totals = {state: miss for state in states}
+        history = []
+        for chord in chords[1:]:
+            miss, states = self.fits(chord_pitches(chord))
+            best = {}
+            back = {}
+            for state in states:
+                choice = None
+                for before, total in totals.items():
+                    total += cost(before, state)
+                    if choice is None or total < best_total:
+                        choice = before
+                        best_total = total
+                best[state] = best_total + miss
+                back[state] = choice
+            history.append(back)
+            totals = best
+        state = min(totals, key=totals.get)
+        total = totals[state]
+        path = [state]
+        for back in reversed(history):
+            state = back[state]
+            path.append(state)
+        return total, [self.key_scale(index) for index in reversed(path)]
+
+
+# The KeyFitter for COMMON_SCALES.  See "common_key_fitter" below.
+COMMON_KEY_FITTER = []
+
+
+def common_key_fitter():
+    """
+    Returns a KeyFitter w/ the default penalties for COMMON_SCALES.  The fitter is
+    rebuilt whenever COMMON_SCALES has been changed.  See "LazyDict.version".
+    """
+    if not COMMON_KEY_FITTER or COMMON_KEY_FITTER[0][0] != COMMON_SCALES.version:
+        COMMON_KEY_FITTER[:] = [(COMMON_SCALES.version, KeyFitter())]
+    return COMMON_KEY_FITTER[0][1]
+
+
+def fit_progression(chords, fitter=None):
+    """
+    Returns a pair of the total cost and the list of keys, as Scales, that best fit
+    the given sequence of Chords.  Every chord must have its root set.  See
+    "KeyFitter" for how the keys are scored.
+    """
+    return (fitter or common_key_fitter()).fit(chords)
+
+
+# The KeyFitter used by a worker process of "fit_progressions".
+WORKER_FITTER = []
+
+
+def install_fitter(fitter):
+    WORKER_FITTER[:] = [fitter]
+
+
+def fit_job(chords):
+    return WORKER_FITTER[0].fit(chords)
+
+
+def fit_progressions(progressions, fitter=None, processes=None, chunk=64):
+    """
+    Yields the result of "fit_progression" for each of a sequence of progressions,
+    in order.  If "processes" is more than one, the progressions are fit by a pool of
+    worker processes, each w/ its own copy of the fitter.
+    """
+    fitter = fitter or common_key_fitter()
+    if not processes or processes < 2:
+        for chords in progressions:
+            yield fitter.fit(chords)
+        return
+    with Pool(processes, initializer=install_fitter, initargs=(fitter,)) as pool:
+        yield from pool.imap(fit_job, progressions, chunk)
+
+
+def test_progression():
+    distances = fifths_distances(Scale("Ionian").mask)
+    assert(distances[Scale("Ionian").mask] == 0)
+    assert(distances[rotate_mask(Scale("Ionian").mask, -7)] == 1)
+    assert(distances[rotate_mask(Scale("Ionian").mask, -5)] == 1)
+    assert(distances[rotate_mask(Scale("Ionian").mask, -6)] == 6)
+
+    fitter = common_key_fitter()
+    chords = [
+        Chord("Major 5th", root="C"),
+        Chord("Minor 5th", root="A"),
+        Chord("Major 5th", root="F"),
+        Chord("Dominant 7th", root="G"),
+        Chord("Major 5th", root="C")]
+    cost, keys = fit_progression(chords)
+    assert(cost == 0)
+    assert(len({(key.mask, key.tonic) for key in keys}) == 1)
+    assert(all(chord_pitches(chord) & ~rotate_mask(keys[0].mask, -keys[0].tonic) == 0 for chord in chords))
+
+    chords = [
+        Chord("Major 5th", root="C"),
+        Chord("Dominant 7th", root="G"),
+        Chord("Dominant 7th", root="D"),
+        Chord("Major 5th", root="G")]
+    cost, keys = fit_progression(chords)
+    assert(len(keys) == 4)
+    assert(keys[0].mask != keys[-1].mask or keys[0].tonic != keys[-1].tonic)
+    assert(0 < cost < fitter.far_penalty)
+    for chord, key in zip(chords, keys):
+        assert(any(key.mask == other.mask and key.tonic == other.tonic for other in fitter.candidates(chord)))
+
+    chromatic = [Chord("Diminished 7th", root="C"), Chord(1, 1, 1, root="C")]
+    cost, keys = fit_progression(chromatic)
+    assert(cost >= fitter.miss_penalty)
+
+    progressions = [chords, chromatic, []] * 3
+    serial = [(cost, [key.nice_name for key in keys]) for cost, keys in fit_progressions(progressions)]
+    pooled = [(cost, [key.nice_name for key in keys]) for cost, keys in fit_progressions(progressions, processes=2, chunk=2)]
+    assert(serial == pooled)
@@ -0,0 +1,105 @@
+#!/usr/bin/python3
+
+from itertools import combinations
+from .catalog import *
+
+
+def query_pitches(notes=(), chords=()):
+    """
+    Returns the bitmask of absolute pitch classes (bit 0 = C) covered by the given
+    notes and chords.  The chords must have their roots set.
+    """
+    pitches = 0
+    for note in notes:
+        pitches |= 1 << note_num(note)
+    for chord in chords:
+        if chord.root is None:
+            raise ValueError("The chord must have the root set to find scales containing it!")
+        pitches |= rotate_mask(fold_mask(chord_mask(chord)), -note_num(chord.root))
+    return pitches
+
+
+def brightness(mask):
+    """
+    Returns the mean of the degrees of a scale bitmask in semitones above the tonic,
+    so that scales with different numbers of notes can be compared.  A larger mean
+    is a brighter scale.
+    """
+    keys = [key for key in range(12) if mask >> key & 1]
+    return sum(keys) / len(keys)
+
+
+def universe_supersets(pitches, extra):
+    """
+    Yields (tonic, mask) pairs for every scale in the universe, at every tonic, that
+    contains the given absolute pitch classes plus exactly "extra" more notes.
+    """
+    for tonic in range(12):
+        required = rotate_mask(pitches, tonic) | 1
+        extra_here = extra - (required.bit_count() - pitches.bit_count())
+        if extra_here < 0:
+            continue
+        free = [1 << key for key in range(12) if not required >> key & 1]
+        for added in combinations(free, extra_here):
+            yield tonic, required | sum(added)
+
+
+def scales_containing(notes=(), chords=(), catalog=None, rank="extra", limit=None):
+    """
+    Returns a list of Scales, with their tonics set, that contain all of the given
+    notes and chords.  Chords must have their roots set.
+
+    If a ScaleCatalog is given, only its scales are searched.  Otherwise every scale
+    in the universe is searched, and the scales are named from COMMON_SCALES where
+    they match.
+
+    The results are ranked by "rank":
+      "extra" - fewest notes beyond the ones asked for first, then brightest.
+      "brightness" - brightest first, then fewest extra notes.
+
+    Neither mode builds a Scale for anything that is not returned.  The universe
+    is searched by enumerating the supersets of the query's bitmask at each tonic,
+    and a catalog through its pitch class index.  See "ScaleCatalog.supersets".
+    """
+    assert(rank in ("extra", "brightness"))
+    pitches = query_pitches(notes, chords)
+    count = pitches.bit_count()
+
+    found = []
+    if catalog is not None:
+        found.extend(catalog.supersets(pitches))
+        name_of = catalog.name
+    else:
+        for extra in range(12 - count + 1):
+            found.extend(universe_supersets(pitches, extra))
+            if rank == "extra" and limit is not None and len(found) >= limit:
+                break
+        name_of = lambda mask: scale_info(mask).name
+
+    if rank == "extra":
+        key = lambda found: (found[1].bit_count(), -brightness(found[1]), found[0], found[1])
+    else:
+        key = lambda found: (-brightness(found[1]), found[1].bit_count(), found[0], found[1])
+    found.sort(key=key)
+    if limit is not None:
+        found = found[:limit]
+    return [Scale(mask, tonic=tonic, name=name_of(mask)) for tonic, mask in found]
+
+
+def test_query():
+    chords = [Chord("Major 5th", root="C"), Chord("Major 5th", root="D")]
+    found = scales_containing(chords=chords, limit=3)
+    assert([scale.intervals for scale in found] == ["232221", "322212", "222123"])
+    found = scales_containing(chords=chords, catalog=common_catalog())
+    assert([scale.nice_name for scale in found[:3]] == ["C Lydian", "G Ionian", "D Mixolydian"])
+    found = scales_containing(notes=["C", "F#"])
+    assert(len(found) == len({(scale.mask, scale.tonic) for scale in found}))
+    assert(len(found) == 7168)
+    for scale in found:
+        assert(note_num("C") in scale.notes() and note_num("F#") in scale.notes())
+
+    found = scales_containing(notes=["C", "E", "G"], rank="brightness", limit=12)
+    assert("111111111111" not in [scale.intervals for scale in found])
+    assert(brightness(Scale("Lydian").mask) > brightness(Scale("111111111111").mask) > brightness(Scale("Locrian").mask))
+    found = scales_containing(notes=["C", "E", "G"], catalog=common_catalog(), rank="brightness")
+    assert(found[0].nice_name == "C Lydian")
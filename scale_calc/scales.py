@@ -1,11 +1,282 @@
 #!/usr/bin/python3
 
 import re
+from collections import OrderedDict
 from .notes import *
 
 
-# This will be prepopulated with common scales.  See "populate_common_scales" below.
-COMMON_SCALES = {}
+class LazyDict(dict):
+    """
+    A dict that is filled in by a deferred function the first time it is read or
+    changed, which keeps the cost of building the package's tables out of import
+    time.  Changes made before the first read are applied on top of the table.
+
+    The "version" goes up every time the dict is changed, so tables derived from
+    it can tell when they need rebuilding.
+    """
+
+    __slots__ = ("__populate", "__version")
+
+
+    def __init__(self):
+        super().__init__()
+        self.__populate = None
+        self.__version = 0
+
+
+    def defer(self, populate):
+        """
+        Sets the function that fills in this dict on first read.
+        """
+        self.__populate = populate
+
+
+    def populate(self):
+        """
+        Fills in this dict now if it hasn't been already.
+        """
+        populate = self.__populate
+        if populate:
+            self.__populate = None
+            populate()
+
+
+    @property
+    def version(self):
+        """
+        The number of changes made to this dict, including the ones that filled it in.
+        """
+        self.populate()
+        return self.__version
+
+
+    def __getitem__(self, key):
+        self.populate()
+        return super().__getitem__(key)
+
+
+    def __contains__(self, key):
+        self.populate()
+        return super().__contains__(key)
+
+
+    def __iter__(self):
+        self.populate()
+        return super().__iter__()
+
+
+    def __len__(self):
+        self.populate()
+        return super().__len__()
+
+
+    def __repr__(self):
+        self.populate()
+        return super().__repr__()
+
+
+    def __eq__(self, other):
+        self.populate()
+        return super().__eq__(other)
+
+
+    def __ne__(self, other):
+        self.populate()
+        return super().__ne__(other)
+
+
+    def __or__(self, other):
+        self.populate()
+        return super().__or__(other)
+
+
+    def __ror__(self, other):
+        self.populate()
+        return super().__ror__(other)
+
+
+    def __reduce__(self):
+        # Pickled as a plain LazyDict of the filled in items, since the deferred
+        # function can't be pickled.
+        self.populate()
+        return (type(self), (), None, None, iter(super().items()))
+
+
+    __hash__ = None
+
+
+    def get(self, key, default=None):
+        self.populate()
+        return super().get(key, default)
+
+
+    def keys(self):
+        self.populate()
+        return super().keys()
+
+
+    def values(self):
+        self.populate()
+        return super().values()
+
+
+    def items(self):
+        self.populate()
+        return super().items()
+
+
+    def copy(self):
+        self.populate()
+        return dict(super().items())
+
+
+    def setdefault(self, key, default=None):
+        self.populate()
+        if not super().__contains__(key):
+            self.__version += 1
+        return super().setdefault(key, default)
+
+
+    def pop(self, key, *default):
+        self.populate()
+        if super().__contains__(key):
+            self.__version += 1
+        return super().pop(key, *default)
+
+
+    def __setitem__(self, key, value):
+        self.populate()
+        self.__version += 1
+        super().__setitem__(key, value)
+
+
+    def __delitem__(self, key):
+        self.populate()
+        self.__version += 1
+        super().__delitem__(key)
+
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+
+    def update(self, *args, **kwargs):
+        self.populate()
+        self.__version += 1
+        super().update(*args, **kwargs)
+
+
+    def clear(self):
+        self.populate()
+        self.__version += 1
+        super().clear()
+
+
+    def popitem(self):
+        self.populate()
+        self.__version += 1
+        return super().popitem()
+
+
+class LRUCache:
+    """
+    A dict-like cache that holds at most "limit" entries, dropping the least
+    recently used entry to make room for a new one.  It counts its hits, misses,
+    and evictions.
+    """
+
+    __slots__ = ("limit", "hits", "misses", "evictions", "__entries")
+
+
+    def __init__(self, limit):
+        assert(limit > 0)
+        self.limit = limit
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__entries = OrderedDict()
+
+
+    def __len__(self):
+        return len(self.__entries)
+
+
+    def __contains__(self, key):
+        return key in self.__entries
+
+
+    def get(self, key, default=None):
+        """
+        Returns the entry for the key, marking it as the most recently used, or the
+        default if there isn't one.
+        """
+        entries = self.__entries
+        try:
+            value = entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+
+    def __setitem__(self, key, value):
+        entries = self.__entries
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > self.limit:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+
+    def lookup(self, key, compute):
+        """
+        Returns the entry for the key, calling compute(key) to fill it in if there
+        isn't one.
+        """
+        value = self.get(key, self)
+        if value is self:
+            value = self[key] = compute(key)
+        return value
+
+
+    def clear(self):
+        """
+        Drops every entry and resets the counts.
+        """
+        self.__entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+    def stats(self):
+        """
+        Returns a dict of the size, limit, hits, misses, and evictions of this cache.
+        """
+        return {
+            "size": len(self.__entries),
+            "limit": self.limit,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# This will be populated with common scales on first use.  See "populate_common_scales" below.
+COMMON_SCALES = LazyDict()
+
+
+# This is filled in with a ScaleInfo record for every scale that includes the
+# tonic, keyed by the scale's bitmask.  See "build_universe" in universe.py.
+UNIVERSE = {}
+
+
+# The (COMMON_SCALES, COMMON_CHORDS) versions UNIVERSE was built from.  See
+# "universe" in universe.py.
+UNIVERSE_VERSIONS = []
 
 
 DIATONIC_MODE_NAMES = (
@@ -33,23 +304,88 @@ def normalize_intervals(intervals):
     return "".join(map(str, intervals))
 
 
+# Bitmask covering every key in one octave.  Bit "n" of a scale's mask is set
+# if the key "n" semitones above the tonic is in the scale.
+OCTAVE_MASK = 0xFFF
+
+
+def intervals_to_mask(intervals):
+    """
+    This takes an interval string like "2212221" and returns the bitmask of the
+    keys in an octave that are covered by the given interval string.  For example,
+    "WWHWWWH" would return 0b101010110101.
+    """
+    mask = 1
+    key = 0
+    for interval in normalize_intervals(intervals)[:-1]:
+        key += int(interval)
+        mask |= 1 << key
+    return mask
+
+
+def mask_to_intervals(mask):
+    """
+    This is the inverse of the function "intervals_to_mask".
+    """
+    assert(mask & 1)
+    acc = []
+    last = 0
+    for key in range(1, 13):
+        if key == 12 or mask >> key & 1:
+            acc.append(key - last)
+            last = key
+    assert(max(acc) <= 9)
+    return "".join(map(str, acc))
+
+
+def keyboard_to_mask(keyboard):
+    """
+    Returns the bitmask for a tuple of 0s and 1s, such as the ones returned by
+    "intervals_to_keyboard".  The keyboard may be any length.
+    """
+    mask = 0
+    for key, state in enumerate(keyboard):
+        if state:
+            mask |= 1 << key
+    return mask
+
+
+def mask_to_keyboard(mask):
+    """
+    Returns the 13 element keyboard tuple for a scale's bitmask.  The tonic is
+    repeated as the last element.
+    """
+    return tuple([mask >> key & 1 for key in range(12)] + [1])
+
+
+def rotate_mask(mask, key):
+    """
+    Rotates a scale's bitmask such that the given key becomes the first key.
+    """
+    key %= 12
+    return (mask >> key | mask << (12 - key)) & OCTAVE_MASK
+
+
+def populate_keyboard_masks():
+    for mask in range(1, OCTAVE_MASK + 1, 2):
+        KEYBOARD_MASKS[bytes(mask_to_keyboard(mask))] = mask
+
+
+# The bitmask of every valid keyboard tuple, keyed by the keyboard as bytes, so
+# "Scale" can check and convert a keyboard in one probe.  This is populated on
+# first use.  See "populate_keyboard_masks" above.
+KEYBOARD_MASKS = LazyDict()
+KEYBOARD_MASKS.defer(populate_keyboard_masks)
+del populate_keyboard_masks
+
+
 def intervals_to_keyboard(intervals):
     """
     This takes an interval string like "2212221" and returns a tuple representing
     which keys in an octave are covered by the given interval string.  For example,
     "WWHWWWH" would return (1, 0, 1, 0, 1, 1, 0, 1, 0, 1, 0, 1, 1).
     """
-    intervals = list(map(int, normalize_intervals(intervals)))
-    keyboard = [1]
-    for interval in intervals:
-        zeros = interval-1
-        for zero in range(zeros):
-            keyboard.append(0)
-        keyboard.append(1)
-    assert(keyboard[0] == 1)
-    assert(keyboard[-1] == 1)
-    assert(len(keyboard) == 13)
-    return tuple(keyboard)
+    return mask_to_keyboard(intervals_to_mask(intervals))
 
 
 def keyboard_to_intervals(keyboard):
@@ -58,13 +394,7 @@ def keyboard_to_intervals(keyboard):
     """
     assert(keyboard[0] == 1)
     assert(keyboard[-1] == 1)
-    cdr = list(keyboard)[1:]
-    acc = []
-    while cdr:
-        next = cdr.index(1) + 1
-        acc.append(next)
-        cdr = cdr[next:]
-    return normalize_intervals("".join(map(str, acc)))
+    return mask_to_intervals(keyboard_to_mask(keyboard[:-1]))
 
 
 class Scale:
@@ -74,46 +404,58 @@ class Scale:
 
     This can be constructed from either a interval string (such as "WWHWWWH" or
     "23232"), from a tuple of 13 integers representing an octave w/ the tonic
-    repeated, or from another instance of this class.
+    repeated, from an integer bitmask (see "OCTAVE_MASK"), or from another
+    instance of this class.
 
-    The "keyboard" and "intervals" attributes of this class are used to retrieve
-    the two different representations of the scale that this class manages,
-    however these are not exposed w/ setters as they are intended to be immutable.
+    Internally the scale is stored as a bitmask.  The "keyboard" and "intervals"
+    attributes of this class are derived from it on demand, and are not exposed
+    w/ setters as they are intended to be immutable.  The "name" and "tonic" can be
+    changed until "freeze" is called.
     """
 
+    __slots__ = ("__name", "__mask", "__tonic", "__frozen")
+
 
     def __init__(self, pattern, tonic=None, name=None):
-        self.name = None
+        # The slots are assigned directly rather than through the property setters,
+        # since a new scale is never frozen.
+        self.__frozen = False
         self.__tonic = None
-
-        if type(pattern) is str and COMMON_SCALES.get(pattern.title()):
-            self.name = pattern.title()
-            pattern = COMMON_SCALES[pattern.title()]
-
-        if type(pattern) is str:
-            self.__keyboard = None
-            self.__intervals = normalize_intervals(pattern)
-
-        elif type(pattern) is tuple:
-            assert(len(pattern) == 13)
-            for key in pattern:
-                assert(type(key) == int)
-                assert(key == 0 or key == 1)
-            self.__keyboard = pattern
-            self.__intervals = None
-
-        elif type(pattern) is Scale:
-            self.__keyboard = pattern.keyboard
-            self.__intervals = None
+        kind = type(pattern)
+
+        if kind is tuple:
+            try:
+                mask = KEYBOARD_MASKS.get(bytes(pattern))
+            except (TypeError, ValueError):
+                mask = None
+            assert(mask is not None)
+            self.__mask = mask
+
+        elif kind is int:
+            assert(pattern & 1)
+            assert(pattern <= OCTAVE_MASK)
+            self.__mask = pattern
+
+        elif kind is Scale:
+            self.__mask = pattern.mask
             self.__tonic = pattern.tonic
-            self.name = pattern.name
+            name = name or pattern.name
+
+        elif kind is str:
+            found = COMMON_SCALES.get(pattern.title())
+            if found:
+                self.__mask = found.mask
+                self.__tonic = found.tonic
+                name = name or found.name
+            else:
+                self.__mask = intervals_to_mask(pattern)
 
         else:
             raise TypeError("Malformed scale pattern.")
 
-        self.name = name or self.name
-        if type(tonic) in [int, str]:
-            self.tonic = tonic
+        self.__name = name or None
+        if type(tonic) is int or type(tonic) is str:
+            self.__tonic = note_num(tonic)
 
 
     def __repr__(self):
@@ -129,20 +471,42 @@ class Scale:
             return "{}".format(name)
 
 
+    @property
+    def name(self):
+        return self.__name
+
+
+    @name.setter
+    def name(self, val):
+        if self.__frozen:
+            raise AttributeError("This scale is read only.")
+        self.__name = val
+
+
+    def freeze(self):
+        """
+        Makes the name and tonic of this scale read only, and returns the scale.
+        """
+        self.__frozen = True
+        return self
+
+
+    @property
+    def mask(self):
+        return self.__mask
+
+
     @property
     def keyboard(self):
-        if not self.__keyboard:
-            assert(self.__intervals)
-            self.__keyboard = intervals_to_keyboard(self.__intervals)
-        return self.__keyboard
+        return mask_to_keyboard(self.__mask)
 
 
     @property
     def intervals(self):
-        if not self.__intervals:
-            assert(self.__keyboard)
-            self.__intervals = keyboard_to_intervals(self.__keyboard)
-        return self.__intervals
+        info = UNIVERSE.get(self.__mask)
+        if info and info.intervals:
+            return info.intervals
+        return mask_to_intervals(self.__mask)
 
 
     @property
@@ -152,6 +516,8 @@ class Scale:
 
     @tonic.setter
     def tonic(self, val):
+        if self.__frozen:
+            raise AttributeError("This scale is read only.")
         self.__tonic = note_num(val)
 
 
@@ -163,7 +529,7 @@ class Scale:
         """
         Returns True if this scale has exactly "n" pitches per octave.
         """
-        return self.keyboard[:12].count(1) == n
+        return self.__mask.bit_count() == n
 
 
     def is_pentatonic(self):
@@ -186,6 +552,9 @@ class Scale:
         steps, and the shortest distance between two adjacent half steps is two
         whole stes.
         """
+        info = UNIVERSE.get(self.__mask)
+        if info:
+            return info.diatonic
         return DIATONIC_INTERVAL_PATTERN.search(self.intervals) is not None
 
 
@@ -195,7 +564,7 @@ class Scale:
         """
         if not self.has_tonic():
             raise ValueError("The scale must have the tonic set to do this.")
-        return [note % 12 for note, state in enumerate(self.keyboard[:-1], scale.tonic) if state]
+        return [(key + self.tonic) % 12 for key in range(12) if self.__mask >> key & 1]
 
 
     def degree(self, note):
@@ -209,13 +578,21 @@ class Scale:
             return None
 
 
+    def degree_masks(self):
+        """
+        Returns a list of bitmasks for each degree of the scale where the mask is
+        rotated to be rooted on that degree.
+        """
+        mask = self.__mask
+        return [rotate_mask(mask, key) for key in range(12) if mask >> key & 1]
+
+
     def degree_keyboards(self):
         """
         Returns a tuple of keyboard tuples for each degree of the scale where the
         keyboard is rooted on that degree.  The root is not repeated.
         """
-        smol = self.keyboard[:-1]
-        return [smol[i:] + smol[:i] for i, state in enumerate(smol) if state]
+        return [mask_to_keyboard(mask)[:-1] for mask in self.degree_masks()]
 
 
 def populate_common_scales():
@@ -251,7 +628,7 @@ def populate_common_scales():
         COMMON_SCALES[name] = Scale(interval, name=name)
 
 
-populate_common_scales()
+COMMON_SCALES.defer(populate_common_scales)
 del populate_common_scales
 
 
@@ -264,3 +641,35 @@ def test_scales():
     intervals = from_scale.intervals
     assert(keyboard_to_intervals(keyboard) == intervals)
     assert(intervals_to_keyboard(intervals) == keyboard)
+    assert(Scale(from_scale.mask).keyboard == keyboard)
+    assert(mask_to_keyboard(intervals_to_mask(intervals)) == keyboard)
+    for malformed in (keyboard[:12], keyboard + (0,), (2,) + keyboard[1:], keyboard[:12] + (0,), (1.0,) + keyboard[1:], ("1",) + keyboard[1:], (-1,) + keyboard[1:]):
+        try:
+            Scale(malformed)
+        except AssertionError:
+            pass
+        else:
+            assert(False)
+
+    table = LazyDict()
+    table.defer(lambda: table.update({"a": 1, "b": 2}))
+    table["c"] = 3
+    del table["a"]
+    assert(dict(table) == {"b": 2, "c": 3})
+    version = table.version
+    table["c"] = 4
+    assert(table.version > version)
+    version = table.version
+    assert(table.setdefault("c", 5) == 4 and table.pop("a", None) is None)
+    assert(table.version == version)
+    table.setdefault("d", 5)
+    assert(table.version > version)
+
+    import pickle
+    for make in (lambda table: table | {}, lambda table: {} | table, lambda table: pickle.loads(pickle.dumps(table))):
+        table = LazyDict()
+        table.defer(lambda: table.update({"a": 1}))
+        assert(make(table) == {"a": 1})
+        table = LazyDict()
+        table.defer(lambda: table.update({"a": 1}))
+        assert(not (table != {"a": 1}))
@@ -0,0 +1,201 @@
+#!/usr/bin/python3
+
+from multiprocessing import Pool
+from .edo import *
+from .chords import *
+
+
+class ScaleConstraints:
+    """
+    A set of constraints on scales, used to enumerate every scale that meets them.
+    The scales are built one interval at a time from the tonic, and any partial
+    scale that can no longer meet the constraints is pruned before its completions
+    are visited.
+
+    count, min_count, max_count - the number of notes per octave.
+    min_step, max_step - the smallest and largest interval between adjacent notes.
+    no_consecutive_half_steps - forbid two adjacent intervals of one step,
+        including across the octave.
+    required, forbidden - keys above the tonic that must or must not be in the
+        scale.  Keys may be note numbers or, for 12 steps, note names relative to C.
+    chords - Chords (or chord bitmasks) that must fit on the tonic.
+    diatonic_like - only allow scales with exactly two interval sizes, spread as
+        evenly as possible, like the diatonic and pentatonic scales.  Combine this
+        with max_step to limit how far apart the two sizes may be.
+    steps - the number of keys per octave, 12 by default.
+    """
+
+    __slots__ = ("steps", "min_count", "max_count", "min_step", "max_step",
+        "no_consecutive_half_steps", "required", "forbidden", "diatonic_like")
+
+
+    def __init__(self, count=None, min_count=None, max_count=None, min_step=1, max_step=None,
+            no_consecutive_half_steps=False, required=(), forbidden=(), chords=(),
+            diatonic_like=False, steps=12):
+        self.steps = steps
+        self.min_count = count or min_count or 1
+        self.max_count = count or max_count or steps
+        self.min_step = min_step
+        self.max_step = min(max_step or steps, steps)
+        self.no_consecutive_half_steps = no_consecutive_half_steps
+        keys = lambda notes: {note_num(note) if steps == 12 else note % steps for note in notes}
+        required = keys(required)
+        for chord in chords:
+            mask = chord_mask(chord)
+            required |= {key % steps for key in range(mask.bit_length()) if mask >> key & 1}
+        self.required = tuple(sorted(required - {0}))
+        self.forbidden = frozenset(keys(forbidden))
+        self.diatonic_like = diatonic_like
+        assert(0 not in self.forbidden)
+
+
+    def prefixes(self, depth):
+        """
+        Returns the list of interval prefixes of the given length that can still lead
+        to a scale, for splitting the search between processes.
+        """
+        return list(self.search(depth=depth))
+
+
+    def search(self, prefix=(), depth=None):
+        """
+        Yields the bitmask of every scale meeting the constraints whose intervals start
+        with the given prefix, in lexicographic order of intervals.  With "depth" set,
+        yields the interval prefixes of that length instead.
+        """
+        steps = self.steps
+        min_step = self.min_step
+        max_step = self.max_step
+        min_count = self.min_count
+        max_count = self.max_count
+        required = self.required
+        forbidden = self.forbidden
+        halves = self.no_consecutive_half_steps
+        diatonic_like = self.diatonic_like
+        intervals = []
+
+        def fits(key, count):
+            remaining = steps - key
+            if not remaining:
+                return min_count <= count <= max_count
+            fewest = max(-(-remaining // max_step), min_count - count)
+            most = min(remaining // min_step, max_count - count)
+            return fewest <= most
+
+        def extend(key, mask, count, sizes):
+            if depth is not None and count == depth:
+                yield tuple(intervals)
+                return
+            if key == steps:
+                if halves and intervals[0] == 1 and intervals[-1] == 1 and count > 1:
+                    return
+                if diatonic_like and not (len(sizes) == 2 and balanced(intervals)):
+                    return
+                yield mask if depth is None else tuple(intervals)
+                return
+            limit = min(max_step, steps - key)
+            for needed in required:
+                if needed > key:
+                    limit = min(limit, needed - key)
+                    break
+            for step in range(min_step, limit + 1):
+                if halves and step == 1 and intervals and intervals[-1] == 1:
+                    continue
+                following = key + step
+                if following in forbidden:
+                    continue
+                if diatonic_like and step not in sizes and len(sizes) == 2:
+                    continue
+                if not fits(following, count + 1):
+                    continue
+                intervals.append(step)
+                yield from extend(
+                    following,
+                    mask | (1 << following if following < steps else 0),
+                    count + 1,
+                    sizes | {step})
+                intervals.pop()
+
+        key = 0
+        mask = 1
+        for step in prefix:
+            intervals.append(step)
+            key += step
+            if key < steps:
+                mask |= 1 << key
+        if not fits(key, len(prefix)):
+            return
+        yield from extend(key, mask, len(prefix), frozenset(prefix))
+
+
+def balanced(intervals):
+    """
+    Returns True if the small intervals of a two-size interval pattern are spread
+    as evenly as possible, which is to say every run of the same length (wrapping
+    around the octave) contains the same number of small intervals give or take one.
+    """
+    small = min(intervals)
+    flags = [interval == small for interval in intervals]
+    count = len(flags)
+    doubled = flags + flags
+    for length in range(1, count):
+        sums = {sum(doubled[start:start + length]) for start in range(count)}
+        if max(sums) - min(sums) > 1:
+            return False
+    return True
+
+
+def search_prefix(job):
+    """
+    Returns the list of bitmasks for one prefix of a search.  This is what runs in
+    the worker processes.
+    """
+    constraints, prefix = job
+    return list(constraints.search(prefix))
+
+
+def find_scales(constraints=None, as_scales=False, processes=None, split_depth=2, **kwargs):
+    """
+    Yields every scale meeting the given ScaleConstraints, or the constraints given
+    as keyword arguments.  Scales are yielded as bitmasks, or as Scale objects if
+    "as_scales" is set, which are only built as they are yielded.
+
+    With "processes" set, the search is split between that many worker processes
+    by the first "split_depth" intervals.  The results are yielded in the same
+    order either way.
+    """
+    if constraints is None:
+        constraints = ScaleConstraints(**kwargs)
+    if as_scales:
+        assert(constraints.steps == 12)
+    if processes:
+        jobs = [(constraints, prefix) for prefix in constraints.prefixes(split_depth)]
+        with Pool(processes) as pool:
+            found = (mask for masks in pool.imap(search_prefix, jobs) for mask in masks)
+            if as_scales:
+                found = map(Scale, found)
+            yield from found
+        return
+    found = constraints.search()
+    if as_scales:
+        found = map(Scale, found)
+    yield from found
+
+
+def test_search():
+    diatonic = set(find_scales(count=7, max_step=2, diatonic_like=True))
+    assert(diatonic == {Scale(name).mask for name in DIATONIC_MODE_NAMES})
+    heptatonic = list(find_scales(count=7))
+    assert(len(heptatonic) == 462)
+    assert(heptatonic == sorted(heptatonic, key=lambda mask: keyboard_to_intervals(mask_to_keyboard(mask))))
+    found = list(find_scales(count=7, max_step=2, no_consecutive_half_steps=True, required=["E"], forbidden=["F"]))
+    for scale in map(Scale, found):
+        assert(scale.is_heptatonic() and "11" not in scale.intervals + scale.intervals[0])
+        assert(max(map(int, scale.intervals)) <= 2)
+        assert(scale.keyboard[4] == 1 and scale.keyboard[5] == 0)
+    assert(Scale("Lydian").mask in found)
+    with_chord = list(find_scales(count=5, chords=[Chord("Minor 7th")], as_scales=True))
+    assert([scale.intervals for scale in with_chord] ==
+        ["12432", "21432", "31332", "32232", "33132", "34122", "34212", "34311"])
+    assert(list(find_scales(count=6, min_step=2, steps=19)) == list(find_scales(count=6, min_step=2, steps=19, processes=2)))
+    assert(list(find_scales(max_count=3)) == list(find_scales(max_count=3, processes=2, split_depth=3)))
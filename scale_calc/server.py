@@ -0,0 +1,393 @@
+#!/usr/bin/python3
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from .cli import *
+
+
+# The operations the server understands.  Each takes a Scale with its tonic set,
+# and the request's "turns", and returns a JSON-ready result.
+OPERATIONS = {
+    "analyze": lambda scale, turns: describe(scale),
+    "spell": lambda scale, turns: spelling(scale),
+    "chords": lambda scale, turns: [chord.nice_name for chord in sorted(find_chords(scale))],
+    "rotate": lambda scale, turns: rotate(scale, turns).nice_name,
+    "name": lambda scale, turns: rename_to_matching_scale(scale).name,
+}
+
+
+# The operations that are worth sending to the process pool even as single
+# requests.  The rest are table lookups, and are computed on the event loop.
+POOLED_OPERATIONS = ("analyze", "rotate")
+
+
+# The errors a malformed request can raise, which are reported back to the client
+# rather than failing the request's connection or batch.
+REQUEST_ERRORS = (AssertionError, KeyError, OverflowError, TypeError, ValueError)
+
+
+def error_message(error):
+    return "{}: {}".format(type(error).__name__, error)
+
+
+def request_key(request):
+    """
+    Returns the cache key for a request, which is a tuple of the operation, the
+    scale's bitmask and tonic, its name and the number of turns.
+    """
+    op = request["op"]
+    if type(op) is not str or op not in OPERATIONS:
+        raise ValueError("Unknown operation: {}".format(op))
+    if type(request.get("name")) not in (str, type(None)):
+        raise TypeError("The scale's name must be a string!")
+    turns = request.get("turns", 0)
+    if type(turns) is not int:
+        raise TypeError("The number of turns must be an integer!")
+    scale = spec_scale(request)
+    tonic = scale.tonic if scale.has_tonic() else note_num("C")
+    return (op, scale.mask, tonic, scale.name, turns)
+
+
+def compute(key):
+    """
+    Computes the result for a cache key.  Only scales w/o a name or named after a
+    common scale are interned, since the names come from the requests.
+    """
+    op, mask, tonic, name, turns = key
+    if name is None or name in COMMON_SCALES:
+        scale = interned_scale(mask, tonic=tonic, name=name)
+    else:
+        scale = Scale(mask, tonic=tonic, name=name)
+    return OPERATIONS[op](scale, turns)
+
+
+def compute_batch(keys):
+    """
+    Computes the results for a list of cache keys, as a list of (error, result)
+    pairs where the error is None or the message of the error raised for that key.
+    This is what runs in the worker processes.
+    """
+    results = []
+    for key in keys:
+        try:
+            results.append((None, compute(key)))
+        except REQUEST_ERRORS as error:
+            results.append((error_message(error), None))
+    return results
+
+
+class AnalysisServer:
+    """
+    A JSON-lines analysis server.  Each request is a JSON object on its own line
+    with an "op" (one of OPERATIONS, or "batch"), a scale spec as accepted by
+    "spec_scale", and optionally "turns" and an "id" which is echoed back.  A
+    "batch" request has a list of such requests under "requests", and its result
+    is the list of their responses, so one bad request doesn't fail the others.
+
+    Results are kept in a bounded LRU cache keyed by "request_key".  Identical
+    requests that arrive while one is being computed wait on the same result
+    rather than computing it again.  Batches, and single requests for one of
+    POOLED_OPERATIONS, are computed in a process pool, so the event loop stays
+    responsive while they run.
+
+    Each connection has at most "max_pending" requests in flight.  Past that, the
+    server stops reading from the connection until one of them is answered.
+    """
+
+    def __init__(self, cache_size=4096, processes=None, max_pending=64):
+        assert(max_pending >= 1)
+        self.max_pending = max_pending
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.__cache = LRUCache(cache_size)
+        self.__pending = {}
+        self.__processes = processes
+        self.__pool = None
+
+
+    @property
+    def cache_size(self):
+        return self.__cache.limit
+
+
+    @cache_size.setter
+    def cache_size(self, val):
+        self.__cache.limit = val
+
+
+    def __cached(self, key):
+        result = self.__cache.get(key, self)
+        if result is not self:
+            self.hits += 1
+        return result
+
+
+    def __store(self, key, result):
+        self.__cache[key] = result
+
+
+    async def __coalesce(self, keys, work):
+        """
+        Returns the (error, result) pairs for a list of keys, from the cache, from
+        identical requests already in flight, or by awaiting work(missing keys),
+        which returns them like "compute_batch".  Only results are cached.
+
+        If the request computing a key is cancelled, the requests waiting on it
+        compute the key again themselves.  A key that can't be looked up gets an
+        error pair of its own, and doesn't fail the other keys.
+        """
+        loop = asyncio.get_running_loop()
+        results = {}
+        waiting = {}
+        missing = []
+        failed = {}
+        for index, key in enumerate(keys):
+            try:
+                if key in results or key in waiting:
+                    continue
+            except REQUEST_ERRORS as error:
+                failed[index] = (error_message(error), None)
+                continue
+            result = self.__cached(key)
+            if result is not self:
+                results[key] = (None, result)
+            elif key in self.__pending:
+                self.coalesced += 1
+                waiting[key] = self.__pending[key]
+            else:
+                self.misses += 1
+                waiting[key] = self.__pending[key] = loop.create_future()
+                missing.append(key)
+        if missing:
+            try:
+                computed = await work(missing)
+            except Exception as error:
+                computed = [(error_message(error), None)] * len(missing)
+            except BaseException:
+                for key in missing:
+                    self.__pending.pop(key).cancel()
+                raise
+            for key, (error, result) in zip(missing, computed):
+                if error is None:
+                    self.__store(key, result)
+                self.__pending.pop(key).set_result((error, result))
+        for key, future in waiting.items():
+            try:
+                # Shielded, so a waiter being cancelled doesn't cancel the others.
+                results[key] = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                results[key] = (await self.__coalesce([key], work))[0]
+        return [failed[index] if index in failed else results[key] for index, key in enumerate(keys)]
+
+
+    async def __inline(self, keys):
+        return compute_batch(keys)
+
+
+    async def __pooled(self, keys):
+        if self.__pool is None:
+            # Forked workers would hold on to the open client sockets, and keep
+            # the clients from seeing the connection close.
+            context = multiprocessing.get_context("forkserver")
+            self.__pool = ProcessPoolExecutor(self.__processes, mp_context=context)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.__pool, compute_batch, keys)
+
+
+    async def handle(self, request):
+        """
+        Returns the response object for a parsed request object.
+        """
+        if type(request) is not dict or request.get("op") != "batch":
+            pooled = type(request) is dict and request.get("op") in POOLED_OPERATIONS
+            return (await self.__respond([request], self.__pooled if pooled else self.__inline))[0]
+        response = {"id": request.get("id")}
+        try:
+            items = list(request["requests"])
+        except REQUEST_ERRORS as error:
+            response["error"] = error_message(error)
+        else:
+            response["result"] = await self.__respond(items, self.__pooled)
+        return response
+
+
+    async def __respond(self, requests, work):
+        """
+        Returns the list of response objects for a list of parsed request objects,
+        each w/ either a "result" or an "error".
+        """
+        responses = []
+        keys = []
+        for request in requests:
+            response = {"id": request.get("id") if type(request) is dict else None}
+            responses.append(response)
+            try:
+                keys.append(request_key(request))
+            except REQUEST_ERRORS as error:
+                response["error"] = error_message(error)
+        computed = iter(await self.__coalesce(keys, work))
+        for response in responses:
+            if "error" not in response:
+                error, result = next(computed)
+                if error is None:
+                    response["result"] = result
+                else:
+                    response["error"] = error
+        return responses
+
+
+    async def __connection(self, reader, writer):
+        pending = set()
+        slots = asyncio.Semaphore(self.max_pending)
+        async def respond(line):
+            try:
+                try:
+                    request = json.loads(line)
+                except ValueError as error:
+                    response = {"id": None, "error": "ValueError: {}".format(error)}
+                else:
+                    response = await self.handle(request)
+                writer.write((json.dumps(response) + "\n").encode())
+                await writer.drain()
+            finally:
+                slots.release()
+        try:
+            async for line in reader:
+                if line.strip():
+                    await slots.acquire()
+                    task = asyncio.create_task(respond(line))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending)
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+    async def start(self, host="127.0.0.1", port=8765):
+        """
+        Starts listening, and returns the asyncio Server.
+        """
+        return await asyncio.start_server(self.__connection, host, port)
+
+
+    def close(self):
+        """
+        Shuts down the process pool, if one was started.
+        """
+        if self.__pool is not None:
+            self.__pool.shutdown()
+            self.__pool = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m scale_calc.server",
+        description="Serve scale analysis as JSON lines over TCP.")
+    parser.add_argument("--host", default="127.0.0.1",
+        help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765,
+        help="port to listen on (default: 8765)")
+    parser.add_argument("--cache-size", type=int, default=4096,
+        help="most results kept in the LRU cache (default: 4096)")
+    parser.add_argument("-j", "--processes", type=int, default=None,
+        help="worker processes for batches (default: one per CPU)")
+    parser.add_argument("--max-pending", type=int, default=64,
+        help="most requests in flight per connection (default: 64)")
+    args = parser.parse_args(argv)
+    if args.max_pending < 1:
+        parser.error("--max-pending must be at least 1")
+
+    async def serve():
+        analysis_server = AnalysisServer(args.cache_size, args.processes, args.max_pending)
+        server = await analysis_server.start(args.host, args.port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            analysis_server.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+def test_server():
+    async def run():
+        analysis_server = AnalysisServer(cache_size=2, max_pending=2)
+        server = await analysis_server.start(port=0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        requests = [
+            {"id": 1, "op": "spell", "intervals": "Ionian", "tonic": "D"},
+            {"id": 2, "op": "spell", "intervals": "Ionian", "tonic": "D"},
+            {"id": 3, "op": "rotate", "intervals": "Locrian", "tonic": "C", "turns": 6},
+            {"id": 4, "op": "bogus", "intervals": "Ionian"},
+            {"id": 5, "op": "batch", "requests": [
+                {"id": 6, "op": "rotate", "intervals": "11118", "turns": 1},
+                {"id": 7, "op": "rotate", "intervals": "Locrian", "tonic": "C", "turns": 6},
+                {"id": 8, "op": "bogus", "intervals": "Ionian"}]},
+        ]
+        for request in requests:
+            writer.write((json.dumps(request) + "\n").encode())
+        writer.write(b'{"id": 9, "op": "spell", "intervals": "Ionian", "name": [1]}\n')
+        writer.write(b'{"id": 10, "op": "rotate", "intervals": "Ionian", "tonic": "C", "turns": 1e400}\n')
+        writer.write(b'{"id": 11, "op": "name", "intervals": "2122122", "tonic": "A"}\n')
+        writer.write_eof()
+        responses = {}
+        async for line in reader:
+            response = json.loads(line)
+            responses[response["id"]] = response
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        assert(responses[1]["result"] == ["D", "E", "F#", "G", "A", "B", "C#"])
+        assert(responses[2]["result"] == responses[1]["result"])
+        assert(responses[3]["result"] == "C Lydian")
+        assert("error" in responses[4])
+        batch = responses[5]["result"]
+        assert([response["id"] for response in batch] == [6, 7, 8])
+        assert("error" in batch[0] and "error" in batch[2])
+        assert(batch[1]["result"] == "C Lydian")
+        assert("TypeError" in responses[9]["error"] and "TypeError" in responses[10]["error"])
+        assert(responses[11]["result"] == "Aeolian")
+        assert(analysis_server.misses in (4, 5))
+        assert(analysis_server.misses + analysis_server.hits + analysis_server.coalesced == 6)
+        analysis_server.close()
+    asyncio.run(run())
+
+    async def cancelled_owner():
+        analysis_server = AnalysisServer()
+        started = asyncio.Event()
+        async def work(keys):
+            started.set()
+            await asyncio.sleep(1)
+            return compute_batch(keys)
+        key = ("spell", Scale("Ionian").mask, 2, None, 0)
+        coalesce = analysis_server._AnalysisServer__coalesce
+        owner = asyncio.create_task(coalesce([key], work))
+        await started.wait()
+        waiter = asyncio.create_task(coalesce([key], analysis_server._AnalysisServer__inline))
+        await asyncio.sleep(0)
+        owner.cancel()
+        assert(await waiter == [(None, ["D", "E", "F#", "G", "A", "B", "C#"])])
+        assert(owner.cancelled())
+        assert(analysis_server.coalesced == 1 and analysis_server.misses == 2)
+    asyncio.run(cancelled_owner())
+
+    mask = Scale("Ionian").mask
+    assert(compute(("spell", mask, 0, "Client Name", 0)) == compute(("spell", mask, 0, None, 0)))
+    assert((mask, 0, "Client Name") not in INTERNED_SCALES)
+    assert((mask, 0, None) in INTERNED_SCALES)
+
+
+if __name__ == "__main__":
+    main()
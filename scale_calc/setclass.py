@@ -0,0 +1,150 @@
+#!/usr/bin/python3
+
+from .catalog import *
+
+
+def invert_mask(pitches):
+    """
+    Returns the inversion of a set of pitch classes about the first key.
+    """
+    inverted = pitches & 1
+    for key in range(1, 12):
+        if pitches >> key & 1:
+            inverted |= 1 << (12 - key)
+    return inverted
+
+
+def least_rotation(pitches):
+    """
+    Returns the least bitmask among the transpositions of a set of pitch classes.
+    For a scale, this is its mode class (see "mode_class").
+    """
+    return min(rotate_mask(pitches, key) for key in range(12) if pitches >> key & 1)
+
+
+def interval_vector(pitches):
+    """
+    Returns the interval class vector of a set of pitch classes, as a tuple of six
+    counts of the pairs of notes that are 1 through 6 semitones apart.
+    """
+    vector = [(pitches & rotate_mask(pitches, step)).bit_count() for step in range(1, 7)]
+    vector[5] //= 2
+    return tuple(vector)
+
+
+def populate_set_classes():
+    for pitches in range(1, OCTAVE_MASK + 1):
+        if pitches in SET_CLASSES:
+            continue
+        prime = min(least_rotation(pitches), least_rotation(invert_mask(pitches)))
+        vector = interval_vector(pitches)
+        members = {rotate_mask(member, key) for member in (prime, invert_mask(prime)) for key in range(12)}
+        for member in members:
+            SET_CLASSES[member] = (prime, vector)
+    SET_CLASSES[0] = (0, (0,) * 6)
+
+
+# The prime form and interval class vector of every set of pitch classes, keyed by
+# bitmask.  Prime forms are the least bitmask under transposition and inversion.
+# Comparing bitmasks compares the highest pitch classes first, which is Rahn's
+# "most packed from the right" ordering rather than Forte's "packed to the left".
+# The two differ for a few set classes, e.g. 5-20 is (0,1,5,6,8) here and
+# (0,1,3,7,8) in Forte's table.  This is populated on first use.  See
+# "populate_set_classes" above.
+SET_CLASSES = LazyDict()
+SET_CLASSES.defer(populate_set_classes)
+del populate_set_classes
+
+
+# Prime forms keyed by their number of pitch classes and interval class vector, for
+# finding Z-related set classes.  The empty set and the single pitch classes share
+# a vector, so the vector alone isn't enough.  See "z_related" below.
+VECTOR_CLASSES = {}
+
+
+def prime_form(pitches):
+    """
+    Returns the prime form of a set of pitch classes.
+    """
+    return SET_CLASSES[pitches][0]
+
+
+def z_related(pitches):
+    """
+    Returns a tuple of the prime forms of every set class that is Z-related to the
+    given set of pitch classes, which is to say they share its interval class vector
+    without being the same set class.
+    """
+    if not VECTOR_CLASSES:
+        for prime, vector in set(SET_CLASSES.values()):
+            VECTOR_CLASSES.setdefault((prime.bit_count(), vector), []).append(prime)
+        for primes in VECTOR_CLASSES.values():
+            primes.sort()
+    prime, vector = SET_CLASSES[pitches]
+    return tuple(other for other in VECTOR_CLASSES[(prime.bit_count(), vector)] if other != prime)
+
+
+def mode_classes(masks):
+    """
+    Returns the mode class of each of a sequence of scale bitmasks.
+    """
+    table = universe()
+    return [min(table[mask].modes) for mask in masks]
+
+
+def prime_forms(masks):
+    """
+    Returns the prime form of each of a sequence of pitch class bitmasks.
+    """
+    return [SET_CLASSES[mask][0] for mask in masks]
+
+
+def interval_vectors(masks):
+    """
+    Returns the interval class vector of each of a sequence of pitch class bitmasks.
+    """
+    return [SET_CLASSES[mask][1] for mask in masks]
+
+
+def group_by_mode_class(scales):
+    """
+    Groups a sequence of Scales (or scale bitmasks) by mode class, and returns a
+    dict of mode classes to lists of the scales that are modes of each other.
+    """
+    scales = list(scales)
+    groups = {}
+    for scale, mode in zip(scales, mode_classes(chord_mask(scale) & OCTAVE_MASK for scale in scales)):
+        groups.setdefault(mode, []).append(scale)
+    return groups
+
+
+def group_by_set_class(scales):
+    """
+    Groups a sequence of Scales (or pitch class bitmasks) by set class, and returns
+    a dict of prime forms to lists of the scales that are equivalent under
+    transposition and inversion.
+    """
+    scales = list(scales)
+    groups = {}
+    for scale, prime in zip(scales, prime_forms(chord_mask(scale) & OCTAVE_MASK for scale in scales)):
+        groups.setdefault(prime, []).append(scale)
+    return groups
+
+
+def test_setclass():
+    assert(prime_form(Scale("Ionian").mask) == prime_form(Scale("Locrian").mask))
+    assert(prime_form(0b10010001) == 0b10001001)
+    assert(prime_form(0b10001001) == 0b10001001)
+    assert(prime_form(0b110001011) == 0b101100011)
+    assert(interval_vector(Scale("Ionian").mask) == (2, 5, 4, 3, 6, 1))
+    all_interval = 0b1010011 << 2
+    assert(prime_form(all_interval) == 0b1010011)
+    assert(z_related(all_interval) == (0b10001011,))
+    assert(z_related(1) == () and z_related(0) == ())
+    assert(sum(1 for prime in set(prime_forms(range(OCTAVE_MASK + 1))) if z_related(prime)) == 46)
+    modes = [Scale(name) for name in DIATONIC_MODE_NAMES] + [Scale("Harmonic Minor")]
+    groups = group_by_mode_class(modes)
+    assert(sorted(map(len, groups.values())) == [1, 7])
+    assert(len(group_by_set_class(modes + [Scale("Harmonic Major 1")])) == 2)
+    assert(group_by_mode_class(iter(modes)) == groups)
+    assert(sorted(map(len, group_by_set_class(scale for scale in modes).values())) == [1, 7])
@@ -0,0 +1,190 @@
+#!/usr/bin/python3
+
+from heapq import nlargest
+from .universe import *
+
+
+SIMILARITY_MEASURES = ("containment", "jaccard", "overlap")
+
+
+def similarity_masks(items, fold=False):
+    """
+    Returns the list of bitmasks for a sequence of chords, scales, or anything else
+    "chord_mask" accepts.  If "fold" is set, each bitmask is folded into a single
+    octave first, so extended chords and scales can be compared by pitch class.
+    """
+    masks = [chord_mask(item) for item in items]
+    if fold:
+        masks = [fold_mask(mask) for mask in masks]
+    return masks
+
+
+def similarity_row(mask, columns, measure="containment"):
+    """
+    Returns the similarity of one bitmask to each of a list of bitmasks.  The
+    measures are:
+
+    "containment": the fraction of the first mask's notes found in the other,
+                   which is the first value "compare_chords" returns.
+    "jaccard": the notes in both divided by the notes in either.
+    "overlap": the count of notes in both.
+
+    An empty set of notes has no similarity to anything, including another empty
+    set, so its containment and jaccard are 0.0.
+    """
+    if measure == "containment":
+        size = mask.bit_count()
+        if not size:
+            return [0.0] * len(columns)
+        return [(mask & column).bit_count() / size for column in columns]
+    if measure == "jaccard":
+        return [(mask & column).bit_count() / ((mask | column).bit_count() or 1) for column in columns]
+    if measure == "overlap":
+        return [(mask & column).bit_count() for column in columns]
+    raise ValueError("Unknown similarity measure: {}".format(measure))
+
+
+def similarity_matrix(rows, columns=None, measure="containment", fold=False):
+    """
+    Returns the matrix comparing every chord or scale in "rows" against every one in
+    "columns", as a list of lists.  The columns default to the rows.  Rows that
+    share a bitmask share the work.  See "similarity_row" for the measures.
+    """
+    rows = similarity_masks(rows, fold)
+    columns = rows if columns is None else similarity_masks(columns, fold)
+    cache = {}
+    matrix = []
+    for mask in rows:
+        row = cache.get(mask)
+        if row is None:
+            row = cache[mask] = similarity_row(mask, columns, measure)
+        matrix.append(list(row))
+    return matrix
+
+
+def nearest_neighbors(items, candidates, count=1, measure="containment", fold=False):
+    """
+    Returns the "count" most similar candidates for each item, as a list of
+    (similarity, candidate index) pairs per item, best first.  Ties go to the
+    candidate that comes first.
+    """
+    candidates = similarity_masks(candidates, fold)
+    order = range(len(candidates))
+    cache = {}
+    neighbors = []
+    for mask in similarity_masks(items, fold):
+        best = cache.get(mask)
+        if best is None:
+            row = similarity_row(mask, candidates, measure)
+            best = cache[mask] = [(row[index], index) for index in nlargest(count, order, key=row.__getitem__)]
+        neighbors.append(best)
+    return neighbors
+
+
+# The number of bits set in every 16-bit value, for "array_popcount".  This is
+# built on first use.
+POPCOUNT_TABLE = []
+
+
+def array_popcount(values):
+    """
+    Returns the number of bits set in each of a NumPy array of 64-bit values.  This
+    uses "numpy.bitwise_count" where NumPy has it, and a table lookup per 16 bits
+    otherwise.
+    """
+    import numpy
+    if hasattr(numpy, "bitwise_count"):
+        return numpy.bitwise_count(values).astype(numpy.int64)
+    if not POPCOUNT_TABLE:
+        POPCOUNT_TABLE.append(numpy.array([value.bit_count() for value in range(1 << 16)], dtype=numpy.uint8))
+    table = POPCOUNT_TABLE[0]
+    counts = numpy.zeros(values.shape, dtype=numpy.int64)
+    for shift in (0, 16, 32, 48):
+        counts += table[(values >> numpy.uint64(shift)) & numpy.uint64(0xFFFF)]
+    return counts
+
+
+def array_similarity_matrix(rows, columns=None, measure="containment", fold=False):
+    """
+    Returns the same matrix as "similarity_matrix", as a NumPy array of shape
+    (rows, columns).  The whole matrix is computed w/ array popcounts rather than
+    one pair at a time.  The bitmasks must fit in 64 bits.  NumPy is imported here,
+    so the rest of the module works without it.
+    """
+    import numpy
+    rows = numpy.array(similarity_masks(rows, fold), dtype=numpy.uint64)
+    columns = rows if columns is None else numpy.array(similarity_masks(columns, fold), dtype=numpy.uint64)
+    both = array_popcount(rows[:, None] & columns[None, :])
+    if measure == "overlap":
+        return both
+    if measure == "containment":
+        sizes = numpy.broadcast_to(array_popcount(rows)[:, None], both.shape)
+    elif measure == "jaccard":
+        sizes = array_popcount(rows[:, None] | columns[None, :])
+    else:
+        raise ValueError("Unknown similarity measure: {}".format(measure))
+    return numpy.divide(both, sizes, out=numpy.zeros(both.shape), where=sizes != 0)
+
+
+def array_nearest_neighbors(items, candidates, count=1, measure="containment", fold=False):
+    """
+    Returns the same neighbors as "nearest_neighbors", as a pair of NumPy arrays of
+    shape (items, count): the similarities, and the candidate indexes.
+    """
+    import numpy
+    matrix = array_similarity_matrix(items, candidates, measure, fold)
+    indexes = numpy.argsort(-matrix, axis=1, kind="stable")[:, :count]
+    return numpy.take_along_axis(matrix, indexes, axis=1), indexes
+
+
+def chord_scale_matrix(chords=None, scales=None, measure="containment"):
+    """
+    Returns the names of the chords, the names of the scales, and the matrix of how
+    well each chord fits each scale, comparing pitch classes from a shared root.
+    These default to COMMON_CHORDS and COMMON_SCALES.
+    """
+    if chords is None:
+        chords = COMMON_CHORDS
+    if scales is None:
+        scales = COMMON_SCALES
+    return (list(chords), list(scales),
+            similarity_matrix(chords.values(), scales.values(), measure, fold=True))
+
+
+def test_similarity():
+    chords = list(COMMON_CHORDS.values())
+    scales = list(COMMON_SCALES.values())
+    matrix = similarity_matrix(chords, scales)
+    for row, chord in zip(matrix, chords):
+        assert(row == [compare_chords(chord, scale)[0] for scale in scales])
+    matrix = similarity_matrix(scales)
+    for row, scale in zip(matrix, scales):
+        assert(row == [compare_chords(scale, other)[0] for other in scales])
+
+    jaccard = similarity_matrix([0b10010001], [0b10010001, 0b10001001, 0b1000000000], "jaccard")
+    assert(jaccard == [[1.0, 0.5, 0.0]])
+
+    names, scale_names, fits = chord_scale_matrix()
+    major = fits[names.index("Major 5th")]
+    assert(major[scale_names.index("Ionian")] == 1.0)
+    assert(major[scale_names.index("Aeolian")] == 2 / 3)
+
+    major = Scale("Ionian")
+    neighbors = nearest_neighbors([major], scales, count=3, measure="jaccard")
+    assert(len(neighbors[0]) == 3)
+    assert(neighbors[0][:2] == [(1.0, scale_names.index("Ionian")), (1.0, scale_names.index("Major"))])
+    assert(neighbors[0][2][0] < 1.0)
+
+    assert(similarity_matrix([0], [0, 1]) == [[0.0, 0.0]])
+    assert(similarity_matrix([0], [0, 1], "jaccard") == [[0.0, 0.0]])
+
+    try:
+        import numpy
+    except ImportError:
+        return
+    for measure in SIMILARITY_MEASURES:
+        for fold in (False, True):
+            expected = similarity_matrix(chords + scales + [0], scales + [0], measure, fold)
+            assert(array_similarity_matrix(chords + scales + [0], scales + [0], measure, fold).tolist() == expected)
+    similarities, indexes = array_nearest_neighbors([major], scales, count=3, measure="jaccard")
+    assert(list(zip(similarities[0].tolist(), indexes[0].tolist())) == neighbors[0])
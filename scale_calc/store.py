@@ -0,0 +1,370 @@
+#!/usr/bin/python3
+
+import mmap
+import struct
+from bisect import bisect_left
+from .universe import *
+
+
+# Result files start w/ a header of the magic number, the format version, the
+# flags, the byte width of each chord bitset, the number of chord names, the byte
+# length of the chord names, and the number of records.  The chord names follow as
+# newline separated UTF-8, padded to a multiple of eight bytes, and the records
+# follow those.
+STORE_MAGIC = b"SCLR"
+STORE_VERSION = 1
+STORE_HEADER = struct.Struct("<4sBBBxHHI")
+
+
+# Set in the header flags when the records were written in ascending key order, so
+# that they can be looked up by binary search.
+STORE_SORTED = 1
+
+
+# Tonic byte for scales w/o a tonic.
+NO_TONIC = 0xFF
+
+
+# Quality codes stored for each degree.  Degrees past the last one in the scale
+# are stored as 0.
+QUALITY_CODES = {"Augmented": 1, "Major": 2, "Minor": 3, "Diminished": 4, "Unknown": 5}
+QUALITY_NAMES = {code: quality for quality, code in QUALITY_CODES.items()}
+
+
+def record_struct(chord_bytes):
+    """
+    Returns the Struct for one record: the scale bitmask, the tonic, the number of
+    degrees, a quality code per degree, and a bitset per degree of the chords that
+    fit on that degree, where bit "n" is the "n"th chord name in the file's header.
+    """
+    return struct.Struct("<HBB12B12" + {4: "I", 8: "Q"}[chord_bytes])
+
+
+def record_dtype(chord_bytes):
+    """
+    Returns the NumPy dtype matching "record_struct".  NumPy is imported here, so
+    the rest of the module works without it.
+    """
+    import numpy
+    return numpy.dtype([
+        ("mask", "<u2"),
+        ("tonic", "u1"),
+        ("degrees", "u1"),
+        ("qualities", "u1", (12,)),
+        ("chords", "<u{}".format(chord_bytes), (12,))])
+
+
+def record_key(mask, tonic):
+    """
+    Returns the sort key of a record, which orders records by bitmask, then tonic.
+    """
+    return mask << 8 | (NO_TONIC if tonic is None else tonic)
+
+
+class ResultWriter:
+    """
+    Writes scale analysis results to a packed binary file, one fixed size record per
+    (scale, tonic) pair.  Use it as a context manager, or call "close" when done so
+    the record count gets written to the header.
+
+    The chord bitsets refer to COMMON_CHORDS, as of when the writer is created.
+    """
+
+    __slots__ = ("__file", "__record", "__chords", "__bodies", "__count", "__last", "__flags")
+
+
+    def __init__(self, path):
+        self.__chords = {name: bit for bit, name in enumerate(COMMON_CHORDS)}
+        if len(self.__chords) > 64:
+            raise ValueError("At most 64 chords can be stored per result file.")
+        chord_bytes = 4 if len(self.__chords) <= 32 else 8
+        self.__record = record_struct(chord_bytes)
+        self.__bodies = {}
+        self.__count = 0
+        self.__last = -1
+        self.__flags = STORE_SORTED
+
+        names = "\n".join(self.__chords).encode("utf-8")
+        self.__file = open(path, "wb")
+        self.__file.write(STORE_HEADER.pack(
+            STORE_MAGIC, STORE_VERSION, 0, chord_bytes, len(self.__chords), len(names), 0))
+        self.__file.write(names + b"\0" * (-len(names) % 8))
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+    def __body(self, mask):
+        """
+        Returns the quality codes and chord bitsets for a scale bitmask.  These don't
+        depend on the tonic, so they are worked out once per bitmask.
+        """
+        try:
+            return self.__bodies[mask]
+        except KeyError:
+            pass
+        info = scale_info(mask)
+        index = common_chord_index()
+        qualities = [QUALITY_CODES[quality] for quality in info.qualities]
+        chords = []
+        for mode in info.modes:
+            bits = 0
+            for name, chord in index.matches(mode):
+                bits |= 1 << self.__chords[name]
+            chords.append(bits)
+        padding = [0] * (12 - len(info.modes))
+        body = self.__bodies[mask] = (len(info.modes), *qualities, *padding, *chords, *padding)
+        return body
+
+
+    def write(self, scale, tonic=None):
+        """
+        Writes the record for a Scale or scale bitmask.  The tonic defaults to the
+        scale's own.
+        """
+        if type(scale) is Scale:
+            mask = scale.mask
+            if tonic is None:
+                tonic = scale.tonic
+        else:
+            mask = scale
+        if tonic is not None:
+            tonic = note_num(tonic)
+        key = record_key(mask, tonic)
+        if key < self.__last:
+            self.__flags &= ~STORE_SORTED
+        self.__last = key
+        self.__file.write(self.__record.pack(mask, NO_TONIC if tonic is None else tonic, *self.__body(mask)))
+        self.__count += 1
+
+
+    def close(self):
+        """
+        Writes the flags and record count to the header and closes the file.
+        """
+        if self.__file.closed:
+            return
+        self.__file.seek(5)
+        self.__file.write(bytes((self.__flags,)))
+        self.__file.seek(12)
+        self.__file.write(struct.pack("<I", self.__count))
+        self.__file.close()
+
+
+class ResultView:
+    """
+    A lightweight view of one record in a ResultStore.  The fields are decoded from
+    the memory map when they are read.
+    """
+
+    __slots__ = ("__store", "__offset")
+
+
+    def __init__(self, store, offset):
+        self.__store = store
+        self.__offset = offset
+
+
+    def __repr__(self):
+        return "<{} Result>".format(self.scale.nice_name)
+
+
+    def __fields(self):
+        return self.__store.record.unpack_from(self.__store.buffer, self.__offset)
+
+
+    @property
+    def mask(self):
+        return struct.unpack_from("<H", self.__store.buffer, self.__offset)[0]
+
+
+    @property
+    def tonic(self):
+        tonic = self.__store.buffer[self.__offset + 2]
+        return None if tonic == NO_TONIC else tonic
+
+
+    @property
+    def scale(self):
+        return Scale(self.mask, tonic=self.tonic, name=scale_info(self.mask).name)
+
+
+    @property
+    def qualities(self):
+        """
+        The harmonic quality of each degree of the scale, as a tuple of strings.
+        """
+        fields = self.__fields()
+        return tuple(QUALITY_NAMES[code] for code in fields[3:3 + fields[2]])
+
+
+    @property
+    def chords(self):
+        """
+        The names of the chords that fit on each degree of the scale, as a tuple of
+        tuples of strings.
+        """
+        fields = self.__fields()
+        names = self.__store.chords
+        return tuple(
+            tuple(name for bit, name in enumerate(names) if bits >> bit & 1)
+            for bits in fields[15:15 + fields[2]])
+
+
+class ResultStore:
+    """
+    Reads a file written by ResultWriter through a read only memory map, so opening
+    it costs the same no matter how many records it holds.  Records are read by
+    position, by iteration, or by key w/ "get".  Use it as a context manager, or
+    call "close" when done.
+    """
+
+    __slots__ = ("__file", "buffer", "record", "chord_bytes", "chords", "count", "flags", "start", "__index")
+
+
+    def __init__(self, path):
+        self.__file = open(path, "rb")
+        self.buffer = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, flags, chord_bytes, chord_count, names_length, count = STORE_HEADER.unpack_from(self.buffer)
+        if magic != STORE_MAGIC or version != STORE_VERSION:
+            self.close()
+            raise ValueError("Not a scale result file: {}".format(path))
+        start = STORE_HEADER.size
+        names = self.buffer[start:start + names_length].decode("utf-8")
+        self.chords = tuple(names.split("\n")) if chord_count else ()
+        self.record = record_struct(chord_bytes)
+        self.chord_bytes = chord_bytes
+        self.flags = flags
+        self.count = count
+        self.start = start + names_length + -names_length % 8
+        self.__index = None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+    def close(self):
+        self.buffer.close()
+        self.__file.close()
+
+
+    def __len__(self):
+        return self.count
+
+
+    def __getitem__(self, position):
+        if position < 0:
+            position += self.count
+        if not 0 <= position < self.count:
+            raise IndexError("Result record out of range.")
+        return ResultView(self, self.start + position * self.record.size)
+
+
+    def __iter__(self):
+        for position in range(self.count):
+            yield ResultView(self, self.start + position * self.record.size)
+
+
+    def key(self, position):
+        """
+        Returns the sort key of the record at the given position.  See "record_key".
+        """
+        offset = self.start + position * self.record.size
+        mask, tonic = struct.unpack_from("<HB", self.buffer, offset)
+        return mask << 8 | tonic
+
+
+    def get(self, scale, tonic=None):
+        """
+        Returns the view of the record for a Scale or scale bitmask, or None if there
+        isn't one.  The tonic defaults to the scale's own.  Sorted files are searched
+        in place, and others are indexed by key on the first lookup.
+        """
+        if type(scale) is Scale:
+            mask = scale.mask
+            if tonic is None:
+                tonic = scale.tonic
+        else:
+            mask = scale
+        if tonic is not None:
+            tonic = note_num(tonic)
+        key = record_key(mask, tonic)
+        if self.flags & STORE_SORTED:
+            position = bisect_left(range(self.count), key, key=self.key)
+            if position == self.count or self.key(position) != key:
+                return None
+        else:
+            if self.__index is None:
+                self.__index = {}
+                for position in range(self.count - 1, -1, -1):
+                    self.__index[self.key(position)] = position
+            position = self.__index.get(key)
+            if position is None:
+                return None
+        return self[position]
+
+
+    def array(self):
+        """
+        Returns the records as a NumPy structured array backed by the memory map, w/o
+        copying them.  This needs NumPy, which is imported on first use.
+        """
+        import numpy
+        return numpy.frombuffer(self.buffer, dtype=record_dtype(self.chord_bytes), count=self.count, offset=self.start)
+
+
+def write_results(path, scales):
+    """
+    Writes the records for a sequence of Scales or (scale, tonic) pairs to the given
+    path, and returns the number of records written.
+    """
+    with ResultWriter(path) as writer:
+        count = 0
+        for scale in scales:
+            if type(scale) is tuple:
+                writer.write(*scale)
+            else:
+                writer.write(scale)
+            count += 1
+    return count
+
+
+def test_store():
+    import os
+    from tempfile import TemporaryDirectory
+    with TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "results.bin")
+        pairs = [(mask, tonic) for mask in range(1, OCTAVE_MASK + 1, 2) for tonic in range(12)]
+        assert(write_results(path, pairs) == len(pairs))
+        assert(os.path.getsize(path) < len(pairs) * 65 + 1024)
+        with ResultStore(path) as store:
+            assert(len(store) == len(pairs))
+            assert(store.flags & STORE_SORTED)
+            dorian = store.get(Scale("Dorian", tonic="D"))
+            assert(dorian.mask == Scale("Dorian").mask)
+            assert(dorian.tonic == note_num("D"))
+            assert(dorian.scale.nice_name == "D Dorian")
+            assert(dorian.qualities == scale_info(dorian.mask).qualities)
+            assert("Minor 7th" in dorian.chords[0])
+            assert("Dominant 7th" in dorian.chords[3])
+            assert(store.get(Scale("Dorian")) is None)
+            assert(store[-1].mask == OCTAVE_MASK)
+
+        path = os.path.join(tmp, "unsorted.bin")
+        write_results(path, [Scale("Aeolian", tonic="A"), Scale("Ionian", tonic="C"), Scale("Dorian")])
+        with ResultStore(path) as store:
+            assert(not store.flags & STORE_SORTED)
+            assert(store.get(Scale("Ionian", tonic="C")).qualities == ("Major", "Minor", "Minor", "Major", "Major", "Minor", "Diminished"))
+            assert(store.get(Scale("Dorian")).tonic is None)
+            assert(store.get(Scale("Dorian", tonic="C")) is None)
+            assert([view.scale.nice_name for view in store] == ["A Aeolian", "C Ionian", "Dorian"])
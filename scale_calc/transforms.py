@@ -1,6 +1,6 @@
 #!/usr/bin/python3
 
-from .scales import *
+from .catalog import *
 
 
 def rename_to_matching_mode(scale):
@@ -8,24 +8,98 @@ def rename_to_matching_mode(scale):
     If the scale's interval pattern matches that of one of the diatonic modes,
     then rename the scale to that.
     """
-    if scale.is_diatonic():
-        for name, reference_scale in COMMON_SCALES.items():
-            if name in DIATONIC_MODE_NAMES and scale.intervals == reference_scale.intervals:
-                return Scale(scale, name=name)
+    name = scale_info(scale.mask).mode_name
+    if name:
+        return Scale(scale, name=name)
     return scale
 
 
-def rename_to_matching_scale(scale):
+def rename_to_matching_scale(scale, catalog=None):
     """
     If the scale's interval pattern matches that of one of the common scales,
-    then rename the scale to that.
+    then rename the scale to that.  If a ScaleCatalog is provided, the names are
+    taken from that instead.
     """
-    for name, reference_scale in COMMON_SCALES.items():
-        if scale.intervals == reference_scale.intervals:
-            return Scale(scale, name=name)
+    if catalog is None:
+        name = scale_info(scale.mask).name
+    else:
+        name = catalog.name(scale.mask)
+    if name:
+        return Scale(scale, name=name)
     return scale
 
 
+# Single steps around the circle of fifths, keyed by scale bitmask.  Each entry is
+# a pair of the rotated bitmask and the change in tonic, or None if the scale
+# cannot take that step.  These are populated on first use.  See
+# "populate_rotation_steps" below.
+SHARPEN_STEPS = LazyDict()
+FLATTEN_STEPS = LazyDict()
+
+
+# Memoized walks around the circle of fifths, keyed by scale bitmask.  See
+# "rotation_orbit" below.
+SHARPEN_ORBITS = {}
+FLATTEN_ORBITS = {}
+
+
+def populate_rotation_steps():
+    SHARPEN_STEPS.defer(None)
+    FLATTEN_STEPS.defer(None)
+    for mask in range(1, OCTAVE_MASK + 1, 2):
+        check = mask >> 5
+        if check:
+            nudge = (check & -check).bit_length() - 1
+            SHARPEN_STEPS[mask] = (rotate_mask(mask, 5 + nudge), nudge)
+        else:
+            SHARPEN_STEPS[mask] = None
+        nudge = 8 - (mask & 0xFF).bit_length()
+        FLATTEN_STEPS[mask] = (rotate_mask(mask, 7 - nudge), -nudge)
+
+
+def rotation_orbit(steps, orbits, mask):
+    """
+    Walks a scale bitmask around the circle of fifths until it repeats or can go no
+    further.  Returns a tuple of the bitmasks visited, the tonic offset at each, the
+    index the walk loops back to (or None), and the tonic offset after the last step.
+    """
+    try:
+        return orbits[mask]
+    except KeyError:
+        pass
+    start = mask
+    seen = {}
+    masks = []
+    offsets = []
+    offset = 0
+    while mask not in seen:
+        seen[mask] = len(masks)
+        masks.append(mask)
+        offsets.append(offset)
+        step = steps[mask]
+        if step is None:
+            break
+        mask, nudge = step
+        offset += nudge
+    loop = seen[mask] if step is not None else None
+    orbit = orbits[start] = (tuple(masks), tuple(offsets), loop, offset)
+    return orbit
+
+
+def rotation_step(steps, orbits, mask, turns):
+    """
+    Returns the bitmask and tonic offset of a scale bitmask after some number of
+    steps around the circle of fifths.  This costs the same for any number of turns.
+    """
+    masks, offsets, loop, total = rotation_orbit(steps, orbits, mask)
+    if turns < len(masks):
+        return masks[turns], offsets[turns]
+    if loop is None:
+        raise ValueError("Scale cannot be rotated past a scale with no note above the 4th!")
+    cycles, rest = divmod(turns - loop, len(masks) - loop)
+    return masks[loop + rest], offsets[loop + rest] + cycles * (total - offsets[loop])
+
+
 def sharpen(scale, turns):
     """
     Rotate a scale some number of turns clockwise around the circle of fifths.
@@ -33,16 +107,10 @@ def sharpen(scale, turns):
     assert(type(scale) == Scale)
     if not scale.has_tonic():
         raise ValueError("Scale cannot be sharpened if the tonic is unset!")
-    if turns <= 0:
-        return rename_to_matching_mode(scale)
-    else:
-        keyboard = scale.keyboard
-        check = keyboard[5:]
-        nudge = check.index(1)
-        shift = 5 + nudge
-        keyboard = (keyboard[:12] + keyboard[:12])[shift:][:13]
-        scale = Scale(keyboard, tonic=(scale.tonic + nudge), name=scale.name)
-        return sharpen(scale, turns - 1)
+    if turns > 0:
+        mask, nudge = rotation_step(SHARPEN_STEPS, SHARPEN_ORBITS, scale.mask, turns)
+        scale = Scale(mask, tonic=(scale.tonic + nudge), name=scale.name)
+    return rename_to_matching_mode(scale)
 
 
 def flatten(scale, turns):
@@ -52,16 +120,10 @@ def flatten(scale, turns):
     assert(type(scale) == Scale)
     if not scale.has_tonic():
         raise ValueError("Scale cannot be flattened if the tonic is unset!")
-    if turns <= 0:
-        return rename_to_matching_mode(scale)
-    else:
-        keyboard = scale.keyboard
-        check = keyboard[:8][-1::-1]
-        nudge = check.index(1)
-        shift = 7 - nudge
-        keyboard = (keyboard[:12] + keyboard[:12])[shift:][:13]
-        scale = Scale(keyboard, tonic=(scale.tonic - nudge), name=scale.name)
-        return flatten(scale, turns - 1)
+    if turns > 0:
+        mask, nudge = rotation_step(FLATTEN_STEPS, FLATTEN_ORBITS, scale.mask, turns)
+        scale = Scale(mask, tonic=(scale.tonic + nudge), name=scale.name)
+    return rename_to_matching_mode(scale)
 
 
 def rotate(scale, turns):
@@ -81,6 +143,27 @@ def rotate(scale, turns):
         return sharpen(scale, turns)
 
 
+def rotations(scale, turns):
+    """
+    Yields the scales one through some number of turns around the circle of fifths
+    from the given scale, walking the circle once.  Positive number of turns =
+    clockwise / sharper.  Negative number of turns = widdershins / flatter.
+    """
+    assert(type(scale) == Scale)
+    if not scale.has_tonic():
+        raise ValueError("Scale cannot be rotated if the tonic is unset!")
+    steps = SHARPEN_STEPS if turns > 0 else FLATTEN_STEPS
+    mask = scale.mask
+    tonic = scale.tonic
+    for turn in range(abs(turns)):
+        step = steps[mask]
+        if step is None:
+            raise ValueError("Scale cannot be sharpened without a note above the 4th!")
+        mask, nudge = step
+        tonic += nudge
+        yield rename_to_matching_mode(Scale(mask, tonic=tonic, name=scale.name))
+
+
 def clink_my_heptatonic(scale):
     """
     This function builds a pentatonic scale from a heptatonic scale by dropping
@@ -99,6 +182,11 @@ def clink_my_heptatonic(scale):
     return Scale(intervals, tonic=tonic, name=name)
 
 
+SHARPEN_STEPS.defer(populate_rotation_steps)
+FLATTEN_STEPS.defer(populate_rotation_steps)
+del populate_rotation_steps
+
+
 def test_transforms():
     clink = clink_my_heptatonic(Scale("Dorian"))
     assert(clink.intervals == "23232")
@@ -121,3 +209,10 @@ def test_transforms():
     assert(rotated.name == "Lydian")
     assert(rotated.intervals == Scale("Lydian").intervals)
     assert(rotated.keyboard == Scale("Lydian").keyboard)
+
+    rotated = rotate(Scale("Locrian", tonic="C"), 7 * 1000)
+    assert(rotated.tonic == note_num("E"))
+    assert(rotated.name == "Locrian")
+
+    scale = Scale("Harmonic Minor", tonic="D")
+    assert([x.nice_name for x in rotations(scale, -9)] == [rotate(scale, -n).nice_name for n in range(1, 10)])
@@ -0,0 +1,118 @@
+#!/usr/bin/python3
+
+from .chords import *
+
+
+class ScaleInfo:
+    """
+    Precomputed facts about one scale in the universe of scales that include the
+    tonic.  These are built by "build_universe" and are meant to be read only.
+
+    The "intervals" attribute is None for the handful of scales that have a gap
+    too large to be written as an interval string.
+    """
+
+    __slots__ = ("mask", "intervals", "note_count", "diatonic", "qualities", "modes", "name", "mode_name")
+
+
+    def __init__(self, mask, intervals, note_count, diatonic, qualities, modes, name, mode_name):
+        self.mask = mask
+        self.intervals = intervals
+        self.note_count = note_count
+        self.diatonic = diatonic
+        self.qualities = qualities
+        self.modes = modes
+        self.name = name
+        self.mode_name = mode_name
+
+
+    def __repr__(self):
+        return "<{} ScaleInfo>".format(self.name or self.intervals or bin(self.mask))
+
+
+def build_universe():
+    """
+    (Re)builds the UNIVERSE table for all 2048 scales that include the tonic.  This
+    is done automatically by "universe" when COMMON_SCALES or COMMON_CHORDS change.
+    """
+    versions = (COMMON_SCALES.version, COMMON_CHORDS.version)
+    names = {}
+    mode_names = {}
+    for name, scale in COMMON_SCALES.items():
+        names.setdefault(scale.mask, name)
+        if name in DIATONIC_MODE_NAMES:
+            mode_names.setdefault(scale.mask, name)
+
+    diatonic = {rotate_mask(COMMON_SCALES["Ionian"].mask, key) for key in range(12)}
+
+    triads = {}
+    for mask in range(1, OCTAVE_MASK + 1, 2):
+        triads[mask] = degree_quality(mask)
+
+    table = {}
+    for mask in range(1, OCTAVE_MASK + 1, 2):
+        try:
+            intervals = mask_to_intervals(mask)
+        except AssertionError:
+            intervals = None
+        modes = tuple(rotate_mask(mask, key) for key in range(12) if mask >> key & 1)
+        table[mask] = ScaleInfo(
+            mask,
+            intervals,
+            len(modes),
+            mask in diatonic,
+            tuple(triads[mode] for mode in modes),
+            modes,
+            names.get(mask),
+            mode_names.get(mask))
+
+    UNIVERSE.clear()
+    UNIVERSE.update(table)
+    UNIVERSE_VERSIONS[:] = [versions]
+
+
+def universe():
+    """
+    Returns the UNIVERSE table, building it on first use and rebuilding it whenever
+    COMMON_SCALES or COMMON_CHORDS have been changed.  See "LazyDict.version".
+    """
+    if not UNIVERSE_VERSIONS or UNIVERSE_VERSIONS[0] != (COMMON_SCALES.version, COMMON_CHORDS.version):
+        build_universe()
+    return UNIVERSE
+
+
+def scale_info(mask):
+    """
+    Returns the ScaleInfo record for the given scale bitmask.  See "universe".
+    """
+    return universe()[mask]
+
+
+def test_universe():
+    from random import randrange
+    mask = randrange(1, OCTAVE_MASK + 1, 2)
+    info = scale_info(mask)
+    scale = Scale(mask)
+    assert(info.note_count == len(scale.degree_keyboards()))
+    assert(info.qualities == tuple(map(degree_quality, scale.degree_keyboards())))
+    if info.intervals:
+        assert(info.diatonic == (DIATONIC_INTERVAL_PATTERN.search(info.intervals) is not None))
+    assert(scale_info(Scale("Dorian").mask).name == "Dorian")
+    assert(scale_info(Scale("Ionian").mask).mode_name == "Ionian")
+
+    hirajoshi = Scale("21414").mask
+    assert(scale_info(hirajoshi).name is None)
+    COMMON_SCALES["Hirajoshi"] = Scale("21414", name="Hirajoshi")
+    try:
+        assert(scale_info(hirajoshi).name == "Hirajoshi")
+    finally:
+        del COMMON_SCALES["Hirajoshi"]
+    assert(scale_info(hirajoshi).name is None)
+
+    augmented = COMMON_CHORDS["Augmented 5th"]
+    COMMON_CHORDS["Augmented 5th"] = Chord(4, 3)
+    try:
+        assert(scale_info(Scale("Ionian").mask).qualities[0] == "Augmented")
+    finally:
+        COMMON_CHORDS["Augmented 5th"] = augmented
+    assert(scale_info(Scale("Ionian").mask).qualities[0] == "Major")